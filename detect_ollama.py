@@ -4,25 +4,95 @@ Script to detect and test Ollama connection from DevContainer.
 """
 
 import asyncio
+import json
 import sys
-from typing import Optional
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
 
 import httpx
 
 
-async def test_ollama_connection(base_url: str) -> bool:
-    """Test if Ollama is accessible at the given URL."""
+# Last successful URL, checked first on the next run
+CACHE_FILE = Path.home() / ".cache" / "mcp_simple_db_access" / "ollama_url"
+CACHE_TTL = 15 * 60  # seconds
+
+
+def load_cached_url() -> Optional[str]:
+    """Return the cached Ollama URL if it is present and fresh."""
+    try:
+        entry = json.loads(CACHE_FILE.read_text())
+        if time.time() - entry["timestamp"] < CACHE_TTL:
+            return entry["url"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def save_cached_url(url: str) -> None:
+    """Remember the detected Ollama URL for subsequent runs."""
+    try:
+        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        CACHE_FILE.write_text(json.dumps({"url": url, "timestamp": time.time()}))
+    except OSError as e:
+        print(f"⚠️  Could not cache Ollama URL: {e}")
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the HTTP client shared by all probes."""
+    return httpx.AsyncClient(
+        # Fail fast on unreachable hosts, but leave headroom to wait for a pooled connection
+        timeout=httpx.Timeout(5.0, connect=2.0, pool=10.0),
+        # Keep idle sockets longer than httpx's 5s default so repeated probes
+        # of the same host reuse their connection
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0),
+    )
+
+
+async def _tcp_open(host: str, port: int, timeout: float = 0.25) -> bool:
+    """Check that a TCP connection to host:port can be opened quickly."""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{base_url}/api/tags")
-            return response.status_code == 200
+        await writer.wait_closed()
+    except OSError:
+        # The port answered; a reset while closing doesn't change that
+        pass
+    return True
+
+
+async def test_ollama_connection(client: httpx.AsyncClient, base_url: str) -> Optional[Dict[str, Any]]:
+    """Test if Ollama is accessible at the given URL.
+
+    Returns the parsed ``/api/tags`` body on success so callers can list
+    models without a second request, or None if Ollama is not reachable.
+    """
+    # Skip the HTTP round-trip for hosts that don't even accept a TCP connection
+    parts = urlsplit(base_url)
+    default_port = 443 if parts.scheme == "https" else 80
+    if parts.hostname and not await _tcp_open(parts.hostname, parts.port or default_port):
+        print(f"Failed to connect to {base_url}: port not reachable")
+        return None
+
+    try:
+        response = await client.get(f"{base_url}/api/tags")
+        if response.status_code != 200:
+            return None
+        return response.json()
     except Exception as e:
         print(f"Failed to connect to {base_url}: {e}")
-        return False
+        return None
+
 
+async def find_ollama_url(client: httpx.AsyncClient) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Try to find the correct Ollama URL.
 
-async def find_ollama_url() -> Optional[str]:
-    """Try to find the correct Ollama URL."""
+    Returns the URL together with its ``/api/tags`` body, or None.
+    """
     # List of possible URLs to try
     urls_to_try = [
         "http://localhost:11434",          # Standard local
@@ -33,36 +103,49 @@ async def find_ollama_url() -> Optional[str]:
         "http://192.168.1.1:11434",        # Common router IP
     ]
 
+    cached_url = load_cached_url()
+    if cached_url:
+        tags = await test_ollama_connection(client, cached_url)
+        if tags is not None:
+            print(f"✅ Found Ollama at {cached_url} (cached)")
+            return cached_url, tags
+
     print("🔍 Searching for Ollama server...")
 
     for url in urls_to_try:
         print(f"   Trying {url}...")
-        if await test_ollama_connection(url):
-            print(f"✅ Found Ollama at {url}")
-            return url
+
+    # Probe all candidates concurrently and stop at the first one that answers
+    tasks = {asyncio.create_task(test_ollama_connection(client, url)): url for url in urls_to_try}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tags = task.result()
+                if tags is not None:
+                    url = tasks[task]
+                    print(f"✅ Found Ollama at {url}")
+                    save_cached_url(url)
+                    return url, tags
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
     print("❌ Could not find Ollama server")
     return None
 
 
-async def list_ollama_models(base_url: str) -> None:
-    """List available Ollama models."""
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(f"{base_url}/api/tags")
-            if response.status_code == 200:
-                data = response.json()
-                models = data.get("models", [])
-                if models:
-                    print(f"📋 Available models at {base_url}:")
-                    for model in models:
-                        print(f"   - {model['name']}")
-                else:
-                    print(f"⚠️  No models found at {base_url}")
-            else:
-                print(f"❌ Failed to list models: {response.status_code}")
-    except Exception as e:
-        print(f"❌ Error listing models: {e}")
+def print_models(base_url: str, tags: Dict[str, Any]) -> None:
+    """Print the models from an ``/api/tags`` response."""
+    models = tags.get("models", [])
+    if models:
+        print(f"📋 Available models at {base_url}:")
+        for model in models:
+            print(f"   - {model['name']}")
+    else:
+        print(f"⚠️  No models found at {base_url}")
 
 
 async def main() -> int:
@@ -70,28 +153,29 @@ async def main() -> int:
     print("🧠 Ollama Connection Detector")
     print("=" * 40)
 
-    # Try to find Ollama
-    ollama_url = await find_ollama_url()
+    async with create_http_client() as client:
+        # Try to find Ollama
+        found = await find_ollama_url(client)
 
-    if ollama_url:
+    if found:
+        ollama_url, tags = found
         print(f"\n🎯 Set your OLLAMA_BASE_URL to: {ollama_url}")
         print(f"   export OLLAMA_BASE_URL={ollama_url}")
 
-        # List available models
+        # List available models from the discovery response
         print("\n📋 Checking available models...")
-        await list_ollama_models(ollama_url)
+        print_models(ollama_url, tags)
 
         print(f"\n✅ You can now use Ollama at {ollama_url}")
         return 0
-    else:
-        print("\n❌ Ollama not found. Please ensure:")
-        print("   1. Ollama is running on the host machine")
-        print("   2. It's accessible on port 11434")
-        print("   3. The DevContainer has network access to the host")
-        print("\n💡 Try running: ollama serve --host 0.0.0.0 on the host")
-        return 1
+
+    print("\n❌ Ollama not found. Please ensure:")
+    print("   1. Ollama is running on the host machine")
+    print("   2. It's accessible on port 11434")
+    print("   3. The DevContainer has network access to the host")
+    print("\n💡 Try running: ollama serve --host 0.0.0.0 on the host")
+    return 1
 
 
 if __name__ == "__main__":
     sys.exit(asyncio.run(main()))
-    sys.exit(asyncio.run(main()))
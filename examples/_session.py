@@ -0,0 +1,82 @@
+"""
+Shared MCP stdio session for the example clients.
+
+Opening a stdio connection spawns ``run_server.py`` and runs the MCP
+initialize handshake. ``shared_session`` does this once and hands the same
+``ClientSession`` to every user, nested or running in concurrent tasks; the
+connection is closed when the last ``async with`` block exits.
+
+The connection is opened and closed by a dedicated owner task, since the
+stdio transport's cancel scopes must be exited by the task that entered them.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+SERVER_PARAMS = StdioServerParameters(
+    command="python",
+    args=[str(Path(__file__).parent.parent / "run_server.py")],
+)
+
+_lock = asyncio.Lock()
+_session: Optional[ClientSession] = None
+_owner: Optional["asyncio.Task[None]"] = None
+_release: Optional[asyncio.Event] = None
+_users = 0
+
+
+async def _own_connection(
+    server_params: StdioServerParameters, ready: "asyncio.Future[ClientSession]", release: asyncio.Event
+) -> None:
+    """Hold the stdio connection open until ``release`` is set."""
+    try:
+        async with stdio_client(server_params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                ready.set_result(session)
+                await release.wait()
+    except Exception as e:
+        if not ready.done():
+            ready.set_exception(e)
+            return
+        raise
+    finally:
+        if not ready.done():
+            ready.cancel()
+
+
+@asynccontextmanager
+async def shared_session(server_params: StdioServerParameters = SERVER_PARAMS) -> AsyncIterator[ClientSession]:
+    """Yield the cached MCP session, connecting on first use."""
+    global _session, _owner, _release, _users
+
+    async with _lock:
+        if _session is None:
+            ready: asyncio.Future[ClientSession] = asyncio.get_running_loop().create_future()
+            release = asyncio.Event()
+            owner = asyncio.create_task(_own_connection(server_params, ready, release))
+            try:
+                session = await ready
+            except BaseException:
+                owner.cancel()
+                await asyncio.gather(owner, return_exceptions=True)
+                raise
+            _session, _owner, _release = session, owner, release
+        _users += 1
+        session = _session
+
+    try:
+        yield session
+    finally:
+        async with _lock:
+            _users -= 1
+            if _users == 0 and _owner is not None and _release is not None:
+                owner, release = _owner, _release
+                _session, _owner, _release = None, None, None
+                release.set()
+                await owner
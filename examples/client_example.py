@@ -6,206 +6,221 @@ This script demonstrates how to connect to and interact with the MCP server
 using various tools for database operations and LLM integration.
 """
 
-from mcp.client.stdio import stdio_client
-from mcp import ClientSession, StdioServerParameters
 import asyncio
-import json
 import sys
-from pathlib import Path
+from typing import Awaitable, Callable
 
-from utilities import extract_text_content
+import orjson
+from mcp import ClientSession
 
-# Add the src directory to the path so we can import the MCP SDK
-sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from _session import shared_session
+from utilities import extract_text_content, log, pretty_json, set_verbose
 
 
 async def run_example_client():
     """Main function to demonstrate MCP client interactions."""
 
-    # Server parameters - adjust path as needed
-    server_params = StdioServerParameters(
-        command="python", args=[str(Path(__file__).parent.parent / "run_server.py")], env=None
-    )
-
     print("🚀 Starting MCP Simple DB Access Client Example")
     print("=" * 50)
 
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            # Initialize the session
-            await session.initialize()
-
-            print("✅ Connected to MCP Server")
-            print()
-
-            # List available tools
-            print("📋 Available Tools:")
-            tools = await session.list_tools()
-            for i, tool in enumerate(tools.tools, 1):
-                print(f"  {i}. {tool.name} - {tool.description}")
-            print()
-
-            # Example 1: Insert sample data
-            print("📝 Example 1: Inserting sample data...")
-            result = await session.call_tool("insert_sample_data", {})
-            print(f"   {extract_text_content(result)}")
-            # Example 2: Query database schema
-            print("🗂️  Example 2: Getting database schema...")
-            result = await session.call_tool("get_database_schema", {})
-            result_text = extract_text_content(result)
-            schema = json.loads(result_text)
-            print("   Database Schema:")
-            for table, info in schema.items():
-                print(f"     📊 Table: {table} ({info['row_count']} rows)")
-                for col in info["columns"]:
-                    print(f"        - {col['name']}: {col['type']}")
-
-            # Example 3: Basic database query
-            print("🔍 Example 3: Querying users table...")
-            result = await session.call_tool("query_database", {"sql": "SELECT * FROM users LIMIT 3"})
-            users = json.loads(extract_text_content(result))
-            print("   Users:")
-            for user in users:
-                print(f"     👤 {user['name']} ({user['email']}) - Age: {user['age']}")
-
-            # Example 4: List Ollama models
-            print("🤖 Example 4: Listing available Ollama models...")
-            result = await session.call_tool("list_ollama_models", {})
-            print(f"   {extract_text_content(result)}")
-
-            # Example 5: Chat with Ollama
-            print("💬 Example 5: Chatting with Ollama...")
+    async with shared_session() as session:
+        print("✅ Connected to MCP Server")
+        print()
+
+        # List available tools
+        print("📋 Available Tools:")
+        tools = await session.list_tools()
+        for i, tool in enumerate(tools.tools, 1):
+            log(f"  {i}. {tool.name} - {tool.description}")
+        print()
+
+        # Example 1: Insert sample data
+        print("📝 Example 1: Inserting sample data...")
+        result = await session.call_tool("insert_sample_data", {})
+        log(f"   {extract_text_content(result)}")
+        # Example 2: Query database schema
+        print("🗂️  Example 2: Getting database schema...")
+        result = await session.call_tool("get_database_schema", {})
+        result_text = extract_text_content(result)
+        schema = orjson.loads(result_text)
+        log("   Database Schema:")
+        for table, info in schema.items():
+            log(f"     📊 Table: {table} ({info['row_count']} rows)")
+            for col in info["columns"]:
+                log(f"        - {col['name']}: {col['type']}")
+
+        # Example 3: Basic database query
+        print("🔍 Example 3: Querying users table...")
+        result = await session.call_tool("query_database", {"sql": "SELECT * FROM users LIMIT 3"})
+        users = orjson.loads(extract_text_content(result))
+        log("   Users:")
+        for user in users:
+            log(f"     👤 {user['name']} ({user['email']}) - Age: {user['age']}")
+
+        # Example 4: List Ollama models
+        print("🤖 Example 4: Listing available Ollama models...")
+        result = await session.call_tool("list_ollama_models", {})
+        log(f"   {extract_text_content(result)}")
+
+        # Example 5: Chat with Ollama
+        print("💬 Example 5: Chatting with Ollama...")
+        result = await session.call_tool(
+            "chat_with_ollama", {"prompt": "Explain what a database is in one sentence.", "model": "llama3.2"}
+        )
+        log(f"   🤖 Ollama: {extract_text_content(result)}")
+
+        # Example 6: Generate SQL with LlamaIndex
+        print("🔧 Example 6: Generating SQL with LlamaIndex...")
+        result = await session.call_tool(
+            "generate_sql_with_llamaindex",
+            {"description": "Find all users older than 25 years", "model": "llama3.2"},
+        )
+        log(f"   {extract_text_content(result)}")
+
+        # Example 7: Analyze data with LlamaIndex
+        print("📊 Example 7: Analyzing data with LlamaIndex...")
+        result = await session.call_tool(
+            "analyze_database_with_llamaindex",
+            {"question": "What insights can you provide about the users in the database?", "model": "llama3.2"},
+        )
+        log(f"   📈 Analysis: {extract_text_content(result)}")
+
+        # Example 8: Chat with context
+        print("🧠 Example 8: Chat with context...")
+        try:
             result = await session.call_tool(
-                "chat_with_ollama", {"prompt": "Explain what a database is in one sentence.", "model": "llama3.2"}
+                "chat_with_context",
+                {
+                    "message": "How many tables are in the database?",
+                    "context": "You are analyzing a SQLite database with user, product, and order tables.",
+                    "model": "llama3.2",
+                },
             )
-            print(f"   🤖 Ollama: {extract_text_content(result)}")
+            log(f"   🤖 Response: {extract_text_content(result)}")
+        except Exception as e:
+            print(f"   Error: {e}")
+        print()
 
-            # Example 6: Generate SQL with LlamaIndex
-            print("🔧 Example 6: Generating SQL with LlamaIndex...")
-            result = await session.call_tool(
-                "generate_sql_with_llamaindex",
-                {"description": "Find all users older than 25 years", "model": "llama3.2"},
-            )
-            print(f"   {extract_text_content(result)}")
+        print("🎉 Example client session completed successfully!")
 
-            # Example 7: Analyze data with LlamaIndex
-            print("📊 Example 7: Analyzing data with LlamaIndex...")
-            result = await session.call_tool(
-                "analyze_database_with_llamaindex",
-                {"question": "What insights can you provide about the users in the database?", "model": "llama3.2"},
-            )
-            print(f"   📈 Analysis: {extract_text_content(result)}")
 
-            # Example 8: Chat with context
-            print("🧠 Example 8: Chat with context...")
-            try:
-                result = await session.call_tool(
-                    "chat_with_context",
-                    {
-                        "message": "How many tables are in the database?",
-                        "context": "You are analyzing a SQLite database with user, product, and order tables.",
-                        "model": "llama3.2",
-                    },
-                )
-                print(f"   🤖 Response: {extract_text_content(result)}")
-            except Exception as e:
-                print(f"   Error: {e}")
-            print()
+CommandHandler = Callable[[ClientSession, str], Awaitable[None]]
+
+
+async def cmd_help(session: ClientSession, arg: str) -> None:
+    """help - Show this help message"""
+    print(HELP_TEXT)
+
+
+async def cmd_tools(session: ClientSession, arg: str) -> None:
+    """tools - List available MCP tools"""
+    tools = await session.list_tools()
+    print("📋 Available MCP Tools:")
+    for i, tool in enumerate(tools.tools, 1):
+        print(f"  {i}. {tool.name} - {tool.description}")
+
+
+async def cmd_sample(session: ClientSession, arg: str) -> None:
+    """sample - Insert sample data"""
+    result = await session.call_tool("insert_sample_data", {})
+    print(f"✅ {extract_text_content(result)}")
+
+
+async def cmd_schema(session: ClientSession, arg: str) -> None:
+    """schema - Show database schema"""
+    result = await session.call_tool("get_database_schema", {})
+    print(pretty_json(extract_text_content(result)))
+
 
-            print("🎉 Example client session completed successfully!")
+async def cmd_users(session: ClientSession, arg: str) -> None:
+    """users - Show all users"""
+    result = await session.call_tool("query_database", {"sql": "SELECT * FROM users"})
+    print(pretty_json(extract_text_content(result)))
+
+
+async def cmd_models(session: ClientSession, arg: str) -> None:
+    """models - List Ollama models"""
+    result = await session.call_tool("list_ollama_models", {})
+    print(extract_text_content(result))
+
+
+async def cmd_chat(session: ClientSession, message: str) -> None:
+    """chat <message> - Chat with Ollama"""
+    if not message:
+        print("❓ Usage: chat <message>")
+        return
+    result = await session.call_tool("chat_with_ollama", {"prompt": message, "model": "llama3.2"})
+    print(f"🤖 {extract_text_content(result)}")
+
+
+async def cmd_sql(session: ClientSession, query: str) -> None:
+    """sql <query> - Execute SELECT query"""
+    if not query:
+        print("❓ Usage: sql <query>")
+    elif query.upper().startswith("SELECT"):
+        result = await session.call_tool("query_database", {"sql": query})
+        print(pretty_json(extract_text_content(result)))
+    else:
+        print("❌ Only SELECT queries are allowed for safety")
+
+
+# Interactive commands keyed by their first word; each docstring doubles as the help line
+HANDLERS: dict[str, CommandHandler] = {
+    "help": cmd_help,
+    "tools": cmd_tools,
+    "sample": cmd_sample,
+    "schema": cmd_schema,
+    "users": cmd_users,
+    "models": cmd_models,
+    "chat": cmd_chat,
+    "sql": cmd_sql,
+}
+QUIT_COMMANDS = frozenset({"quit", "exit"})
+HELP_TEXT = "\n".join(
+    ["Available commands:"] + [f"  {handler.__doc__}" for handler in HANDLERS.values()] + ["  quit - Exit the client"]
+)
 
 
 async def interactive_client():
     """Interactive client for manual testing."""
 
-    server_params = StdioServerParameters(
-        command="python", args=[str(Path(__file__).parent.parent / "run_server.py")], env=None
-    )
-
     print("🔧 Interactive MCP Client")
     print("Type 'help' for available commands, 'quit' to exit")
     print("=" * 40)
 
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            # Initialize the session
-            await session.initialize()
-
-            print("✅ Connected to Interactive MCP Server")
-            print()
-
-            # List available tools for reference
-            tools = await session.list_tools()
-            print("Available commands:")
-            print("  help - Show this help message")
-            print("  tools - List available MCP tools")
-            print("  sample - Insert sample data")
-            print("  schema - Show database schema")
-            print("  users - Show all users")
-            print("  models - List Ollama models")
-            print("  chat <message> - Chat with Ollama")
-            print("  sql <query> - Execute SELECT query")
-            print("  quit - Exit the client")
-            print()
-
-            while True:
-                try:
-                    command = input("🔧 > ").strip()
-
-                    if command in ["quit", "exit"]:
-                        break
-                    elif command == "help":
-                        print("Available commands:")
-                        print("  help - Show this help message")
-                        print("  tools - List available MCP tools")
-                        print("  sample - Insert sample data")
-                        print("  schema - Show database schema")
-                        print("  users - Show all users")
-                        print("  models - List Ollama models")
-                        print("  chat <message> - Chat with Ollama")
-                        print("  sql <query> - Execute SELECT query")
-                        print("  quit - Exit the client")
-                    elif command == "tools":
-                        print("📋 Available MCP Tools:")
-                        for i, tool in enumerate(tools.tools, 1):
-                            print(f"  {i}. {tool.name} - {tool.description}")
-                    elif command == "sample":
-                        result = await session.call_tool("insert_sample_data", {})
-                        print(f"✅ {extract_text_content(result)}")
-                    elif command == "schema":
-                        result = await session.call_tool("get_database_schema", {})
-                        print(json.dumps(json.loads(extract_text_content(result)), indent=2))
-                    elif command == "users":
-                        result = await session.call_tool("query_database", {"sql": "SELECT * FROM users"})
-                        print(json.dumps(json.loads(extract_text_content(result)), indent=2))
-                    elif command == "models":
-                        result = await session.call_tool("list_ollama_models", {})
-                        print(extract_text_content(result))
-                    elif command.startswith("chat "):
-                        message = command[5:]
-                        result = await session.call_tool("chat_with_ollama", {"prompt": message, "model": "llama3.2"})
-                        print(f"🤖 {extract_text_content(result)}")
-                    elif command.startswith("sql "):
-                        query = command[4:]
-                        if query.strip().upper().startswith("SELECT"):
-                            result = await session.call_tool("query_database", {"sql": query})
-                            print(json.dumps(json.loads(extract_text_content(result)), indent=2))
-                        else:
-                            print("❌ Only SELECT queries are allowed for safety")
-                    else:
-                        print("❓ Unknown command. Type 'help' for available commands.")
-
-                except KeyboardInterrupt:
+    async with shared_session() as session:
+        print("✅ Connected to Interactive MCP Server")
+        print()
+
+        print(HELP_TEXT)
+        print()
+
+        while True:
+            try:
+                command = input("🔧 > ").strip()
+
+                if command in QUIT_COMMANDS:
                     break
-                except Exception as e:
-                    print(f"❌ Error: {e}")
 
-            print("\n👋 Goodbye!")
+                verb, _, rest = command.partition(" ")
+                handler = HANDLERS.get(verb)
+                if handler:
+                    await handler(session, rest.strip())
+                else:
+                    print("❓ Unknown command. Type 'help' for available commands.")
+
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                print(f"❌ Error: {e}")
+
+        print("\n👋 Goodbye!")
 
 
 async def main():
     """Main entry point with mode selection."""
-    if len(sys.argv) > 1 and sys.argv[1] == "--interactive":
+    set_verbose("--quiet" not in sys.argv[1:])
+    if "--interactive" in sys.argv[1:]:
         await interactive_client()
     else:
         await run_example_client()
@@ -7,57 +7,55 @@ and perform basic database operations.
 """
 
 import asyncio
-import json
-from pathlib import Path
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+import orjson
 
+from _session import shared_session
 from utilities import extract_text_content
 
 
 async def simple_example():
     """Simple example demonstrating basic MCP operations."""
 
-    # Configure server connection
-    server_params = StdioServerParameters(
-        command="python",
-        args=[str(Path(__file__).parent.parent / "run_server.py")],
-    )
-
     print("Connecting to MCP Server...")
 
-    # Connect to the server
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            # Initialize connection
-            await session.initialize()
-            print("Connected!")
-
-            # Insert sample data
-            print("\n1. Inserting sample data...")
-            result = await session.call_tool("insert_sample_data", {})
-            print(f"   {extract_text_content(result)}")
-
-            # Query the database
-            print("\n2. Querying users...")
-            result = await session.call_tool("query_database", {"sql": "SELECT name, email FROM users LIMIT 2"})
-            users_text = extract_text_content(result)
-            if users_text != "No text content available":
-                users = json.loads(users_text)
-                for user in users:
-                    print(f"   - {user['name']} ({user['email']})")
-
-            # Get database schema
-            print("\n3. Getting database schema...")
-            result = await session.call_tool("get_database_schema", {})
-            schema_text = extract_text_content(result)
-            if schema_text != "No text content available":
-                schema = json.loads(schema_text)
-                print(f"   Found {len(schema)} tables: {', '.join(schema.keys())}")
-
-            # Try chatting with Ollama (if available)
-            print("\n4. Testing Ollama integration...")
+    # Connect to the server (reuses an already open session if there is one)
+    async with shared_session() as session:
+        print("Connected!")
+
+        # Insert sample data
+        print("\n1. Inserting sample data...")
+        result = await session.call_tool("insert_sample_data", {})
+        print(f"   {extract_text_content(result)}")
+
+        # The schema lookup and the Ollama model check don't depend on the user query,
+        # so start them now and collect the results when they are needed
+        schema_task = asyncio.create_task(session.call_tool("get_database_schema", {}))
+        models_task = asyncio.create_task(session.call_tool("list_ollama_models", {}))
+
+        # Query the database
+        print("\n2. Querying users...")
+        result = await session.call_tool("query_database", {"sql": "SELECT name, email FROM users LIMIT 2"})
+        users_text = extract_text_content(result)
+        if users_text:
+            users = orjson.loads(users_text)
+            for user in users:
+                print(f"   - {user['name']} ({user['email']})")
+
+        schema_result, models_result = await asyncio.gather(schema_task, models_task)
+
+        # Get database schema
+        print("\n3. Getting database schema...")
+        schema_text = extract_text_content(schema_result)
+        if schema_text:
+            schema = orjson.loads(schema_text)
+            print(f"   Found {len(schema)} tables: {', '.join(schema.keys())}")
+
+        # Try chatting with Ollama, but only if the model is installed
+        print("\n4. Testing Ollama integration...")
+        if "llama3.2" not in extract_text_content(models_result):
+            print("   Ollama not available or llama3.2 is not installed, skipping chat")
+        else:
             try:
                 result = await session.call_tool(
                     "chat_with_ollama", {"prompt": "Hello! Can you tell me what MCP stands for?", "model": "llama3.2"}
@@ -66,7 +64,7 @@ async def simple_example():
             except Exception as e:
                 print(f"   Ollama not available: {e}")
 
-            print("\n✅ Simple example completed!")
+        print("\n✅ Simple example completed!")
 
 
 if __name__ == "__main__":
@@ -1,8 +1,34 @@
+from typing import Any
+
+import orjson
 from mcp.types import CallToolResult, TextContent
 
+# Detail output (tool responses, per-item listings) is printed unless --quiet is given
+_verbose = True
+
+
+def set_verbose(enabled: bool) -> None:
+    """Enable or disable detail output from log()."""
+    global _verbose
+    _verbose = enabled
+
+
+def log(*args: Any) -> None:
+    """Print detail output unless the example runs with --quiet."""
+    if _verbose:
+        print(*args)
+
 
 def extract_text_content(result: CallToolResult) -> str:
-    """Safely extract text content from MCP result."""
-    if result.content and isinstance(result.content[0], TextContent):
-        return result.content[0].text
-    return "No text content available"
+    """Safely extract text content from MCP result, or "" if there is none."""
+    content = result.content
+    if content:
+        first = content[0]
+        if type(first) is TextContent:
+            return first.text
+    return ""
+
+
+def pretty_json(text: str) -> str:
+    """Re-indent a JSON tool response for display."""
+    return orjson.dumps(orjson.loads(text), option=orjson.OPT_INDENT_2).decode()
@@ -3,8 +3,7 @@
 Entry point script for the MCP Simple DB Access server.
 """
 
-import asyncio
-from src.mcp_simple_db_access.server import main
+from mcp_simple_db_access.server import sync_main
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sync_main()
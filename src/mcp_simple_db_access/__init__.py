@@ -7,7 +7,7 @@ This package provides an MCP server that enables:
 - Data analysis and querying capabilities
 """
 
-from .server import main
+from .server import main, sync_main
 
 __version__ = "0.1.0"
-__all__ = ["main"]
+__all__ = ["main", "sync_main"]
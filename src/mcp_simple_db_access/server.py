@@ -10,15 +10,20 @@ This server provides tools for:
 """
 
 import asyncio
-import json
+import functools
+import hashlib
 import os
+import re
 import aiosqlite
+import orjson
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 import httpx
 import logging
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 from mcp.types import Tool, TextContent, Resource
 
 # LlamaIndex imports
@@ -32,78 +37,351 @@ mcp = FastMCP("mcp-simple-db-access")
 # Constants
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 DEFAULT_MODEL = "llama3.2"
+RESPONSE_CACHE_SIZE = 512
+# Maximum number of completions sent to Ollama at once
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
 DB_PATH = "data/app.db"
+READ_POOL_SIZE = 4
+
+# User tables only; skips SQLite's internal sqlite_sequence / sqlite_stat1
+USER_TABLES_QUERY = "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+# Tables counted per UNION ALL statement; SQLite's default SQLITE_MAX_COMPOUND_SELECT is 500
+COUNT_ROWS_BATCH_SIZE = 500
+# Fixed statement text so the prepared statement is reused for every table
+TABLE_INFO_QUERY = "SELECT * FROM pragma_table_info(?)"
+# Statements that can add, drop or rename tables
+DDL_PREFIXES = ("CREATE", "DROP", "ALTER")
+
+# Input guards for the SQL-accepting tools
+_SELECT_RE = re.compile(r"\A\s*SELECT\b", re.IGNORECASE)
+_CREATE_TABLE_RE = re.compile(r"\A\s*CREATE\s+TABLE\b", re.IGNORECASE)
+# Line and block comments; an unterminated block comment runs to the end, as in SQLite
+_SQL_COMMENT_PATTERN = r"--[^\n]*|/\*(?:[^*]|\*(?!/))*(?:\*/|\Z)"
+# String literals, quoted identifiers and comments are matched (and skipped) whole,
+# so only a bare ';' captures group 1
+_STATEMENT_SEPARATOR_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|" + _SQL_COMMENT_PATTERN + r"|(;)")
+# Whitespace and comments allowed after the final ';'
+_STATEMENT_TAIL_RE = re.compile(r"(?:\s+|" + _SQL_COMMENT_PATTERN + r")*\Z")
+# Applied to every new database connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Ensure data directory exists
-Path("data").mkdir(exist_ok=True)
-
 # Initialize LlamaIndex Ollama LLM
 
 
+@functools.lru_cache(maxsize=8)
 def get_ollama_llm(model: str = DEFAULT_MODEL, base_url: str = OLLAMA_BASE_URL) -> Ollama:
-    """Get Ollama LLM instance via LlamaIndex."""
+    """Get Ollama LLM instance via LlamaIndex.
+
+    Instances are cached per ``(model, base_url)`` so each request reuses the
+    same client instead of rebuilding it.
+    """
     return Ollama(model=model, base_url=base_url, request_timeout=60.0)
 
 
-# Set global LLM for LlamaIndex
-Settings.llm = get_ollama_llm()
+@functools.cache
+def _ensure_llamaindex_configured() -> None:
+    """Set LlamaIndex's global default LLM on first use rather than at import."""
+    Settings.llm = get_ollama_llm()
+
+
+def _messages_to_prompt(messages: List[Dict[str, str]]) -> str:
+    """Flatten chat messages into ``role: content`` lines for a completion prompt."""
+    # A list (not a generator) lets str.join size the result in one pass
+    return "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
 
 
 class OllamaLlamaIndexClient:
     """Client for interacting with Ollama via LlamaIndex."""
 
-    def __init__(self, base_url: str = OLLAMA_BASE_URL):
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        cache_size: int = RESPONSE_CACHE_SIZE,
+        max_concurrency: int = OLLAMA_MAX_CONCURRENCY,
+    ):
         self.base_url = base_url
+        self.cache_size = cache_size
+        # Caps in-flight completions so a single Ollama host isn't overloaded
+        self._llm_sem = asyncio.Semaphore(max_concurrency)
+        self._http: Optional[httpx.AsyncClient] = None
+        # LRU cache of generated responses keyed by a hash of (model, prompt)
+        self._response_cache: "OrderedDict[str, str]" = OrderedDict()
+        # Generations currently running, keyed like the response cache
+        self._inflight: Dict[str, "asyncio.Future[str]"] = {}
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Long-lived HTTP client for the Ollama REST API, created on first use."""
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=60.0)
+        return self._http
+
+    async def aclose(self) -> None:
+        """Close the HTTP client."""
+        if self._http is not None:
+            http, self._http = self._http, None
+            await http.aclose()
+
+    def invalidate(self) -> None:
+        """Drop all cached responses."""
+        self._response_cache.clear()
+
+    @staticmethod
+    def _cache_key(model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model}|{prompt}".encode()).hexdigest()
+
+    def _remember(self, key: str, text: str) -> None:
+        """Store a response in the LRU cache, evicting the oldest if full."""
+        self._response_cache[key] = text
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > self.cache_size:
+            self._response_cache.popitem(last=False)
+
+    async def _complete(self, model: str, prompt: str) -> str:
+        """Run one completion against Ollama."""
+        llm = get_ollama_llm(model, self.base_url)
+        async with self._llm_sem:
+            response = await llm.acomplete(prompt)
+        return str(response)
 
     async def generate(self, model: str, prompt: str, **kwargs) -> str:
-        """Generate text using Ollama model via LlamaIndex."""
+        """Generate text using Ollama model via LlamaIndex.
+
+        Responses for identical ``(model, prompt)`` pairs are served from an
+        in-memory LRU cache, and concurrent requests for a pair that is still
+        being generated share that single Ollama call. Calls that pass a
+        sampling ``temperature`` bypass both, since they ask for varied output.
+        """
+        use_cache = kwargs.get("temperature") is None
+        key = self._cache_key(model, prompt)
+        if use_cache and key in self._response_cache:
+            self._response_cache.move_to_end(key)
+            return self._response_cache[key]
+
         try:
-            llm = get_ollama_llm(model, self.base_url)
-            response = await llm.acomplete(prompt)
-            return str(response)
+            if use_cache:
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = asyncio.ensure_future(self._complete(model, prompt))
+                    self._inflight[key] = pending
+                    pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+                # Shield so one caller giving up doesn't cancel the others' request
+                text = await asyncio.shield(pending)
+            else:
+                text = await self._complete(model, prompt)
         except Exception as e:
             logger.error(f"LlamaIndex Ollama error: {e}")
             return f"Error communicating with Ollama via LlamaIndex: {e}"
 
+        if use_cache:
+            self._remember(key, text)
+        return text
+
+    async def generate_stream(self, model: str, prompt: str) -> AsyncIterator[str]:
+        """Generate text, yielding it in chunks as Ollama produces tokens.
+
+        A cached response is yielded as a single chunk; a completed stream is
+        added to the response cache. Errors are yielded as an error message,
+        like ``generate``.
+        """
+        key = self._cache_key(model, prompt)
+        if key in self._response_cache:
+            self._response_cache.move_to_end(key)
+            yield self._response_cache[key]
+            return
+
+        parts: List[str] = []
+        try:
+            llm = get_ollama_llm(model, self.base_url)
+            async with self._llm_sem:
+                async for chunk in await llm.astream_complete(prompt):
+                    if chunk.delta:
+                        parts.append(chunk.delta)
+                        yield chunk.delta
+        except Exception as e:
+            logger.error(f"LlamaIndex Ollama streaming error: {e}")
+            yield f"Error communicating with Ollama via LlamaIndex: {e}"
+            return
+
+        self._remember(key, "".join(parts))
+
     async def list_models(self) -> List[str]:
         """List available models in Ollama."""
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(f"{self.base_url}/api/tags")
-                response.raise_for_status()
-                result = response.json()
-                return [model["name"] for model in result.get("models", [])]
-            except Exception as e:
-                logger.error(f"Error listing models: {e}")
-                return []
+        try:
+            response = await self.http.get(f"{self.base_url}/api/tags")
+            response.raise_for_status()
+            result = response.json()
+            return [model["name"] for model in result.get("models", [])]
+        except Exception as e:
+            logger.error(f"Error listing models: {e}")
+            return []
 
     async def chat(self, model: str, messages: List[Dict[str, str]], **kwargs) -> str:
         """Chat with Ollama model via LlamaIndex."""
         try:
             llm = get_ollama_llm(model, self.base_url)
             # Convert messages to a single prompt for completion
-            prompt = "\n".join(
-                [f"{msg['role']}: {msg['content']}" for msg in messages])
-            response = await llm.acomplete(prompt)
+            prompt = _messages_to_prompt(messages)
+            async with self._llm_sem:
+                response = await llm.acomplete(prompt)
             return str(response)
         except Exception as e:
             logger.error(f"LlamaIndex Ollama chat error: {e}")
             return f"Error in chat with Ollama via LlamaIndex: {e}"
 
 
+def _quote_identifier(name: str) -> str:
+    """Quote an SQL identifier such as a table name."""
+    return '"' + name.replace('"', '""') + '"'
+
+
 class DatabaseManager:
-    """Manager for SQLite database operations."""
+    """Manager for SQLite database operations.
+
+    Writes go through one shared writer connection guarded by a lock, while
+    SELECTs are served from a small pool of read-only connections so they can
+    run concurrently (SQLite in WAL mode allows many readers alongside a
+    writer). Connections are opened on first use; call ``close()`` (or use the
+    manager as an async context manager) when done.
+    """
 
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, read_pool_size: int = READ_POOL_SIZE):
         self.db_path = db_path
+        self.read_pool_size = read_pool_size
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._read_pool: Optional[asyncio.Queue[aiosqlite.Connection]] = None
+        self._read_pool_lock = asyncio.Lock()
+        # Serialized schema snapshot, valid for the schema version it was built at
+        self._schema_version = 0
+        self._schema_cache: Optional[str] = None
+        # User table names keyed by their casefolded form (SQLite identifiers are
+        # case-insensitive), loaded on first use and dropped after DDL
+        self._known_tables: Optional[Dict[str, str]] = None
+
+    async def __aenter__(self) -> "DatabaseManager":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _open_connection(self, *extra_pragmas: str) -> aiosqlite.Connection:
+        """Open a new connection with the standard pragmas applied."""
+        # Rows come back as plain tuples; execute_query pairs them with column names
+        db = await aiosqlite.connect(self.db_path)
+        for pragma in CONNECTION_PRAGMAS + extra_pragmas:
+            await db.execute(pragma)
+        return db
+
+    async def connect(self) -> aiosqlite.Connection:
+        """Open the shared writer connection if it is not open yet."""
+        if self._db is None:
+            # Create the database directory (e.g. data/) off the event loop
+            await asyncio.to_thread(Path(self.db_path).parent.mkdir, parents=True, exist_ok=True)
+            self._db = await self._open_connection()
+        return self._db
+
+    async def _get_read_pool(self) -> "asyncio.Queue[aiosqlite.Connection]":
+        """Open the read-only connection pool if it is not open yet."""
+        async with self._read_pool_lock:
+            if self._read_pool is None:
+                # Make sure the writer has switched the file to WAL before readers attach
+                async with self._lock:
+                    await self.connect()
+                readers = await asyncio.gather(
+                    *(self._open_connection("PRAGMA query_only=1") for _ in range(self.read_pool_size))
+                )
+                pool: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+                for reader in readers:
+                    pool.put_nowait(reader)
+                self._readers = list(readers)
+                self._read_pool = pool
+            return self._read_pool
+
+    @asynccontextmanager
+    async def acquire_reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool."""
+        pool = await self._get_read_pool()
+        reader = await pool.get()
+        try:
+            yield reader
+        finally:
+            pool.put_nowait(reader)
+
+    async def close(self) -> None:
+        """Close the writer connection and the read pool."""
+        readers, self._readers, self._read_pool = self._readers, [], None
+        for reader in readers:
+            await reader.close()
+        if self._db is not None:
+            db, self._db = self._db, None
+            await db.close()
+
+    @property
+    def schema_version(self) -> int:
+        """Counter bumped by every write, used to detect a stale schema snapshot."""
+        return self._schema_version
+
+    def invalidate_schema(self) -> None:
+        """Drop the cached schema snapshot."""
+        self._schema_version += 1
+        self._schema_cache = None
+
+    def get_schema_snapshot(self) -> Optional[str]:
+        """Return the cached schema JSON, or None if it must be rebuilt."""
+        return self._schema_cache
+
+    def set_schema_snapshot(self, version: int, snapshot: str) -> None:
+        """Cache a schema JSON built at ``version`` unless a write happened since."""
+        if version == self._schema_version:
+            self._schema_cache = snapshot
+
+    async def _load_known_tables(self) -> Dict[str, str]:
+        if self._known_tables is None:
+            rows = await self.execute_query(USER_TABLES_QUERY)
+            self._known_tables = {row["name"].casefold(): row["name"] for row in rows}
+        return self._known_tables
+
+    async def known_tables(self) -> List[str]:
+        """Return the names of the user tables in the database, in creation order."""
+        return list((await self._load_known_tables()).values())
+
+    async def require_table(self, table_name: str) -> str:
+        """Return the table's stored name quoted for SQL, or raise ValueError if no such table exists.
+
+        The lookup ignores case, like SQLite's own identifier matching.
+        """
+        try:
+            name = (await self._load_known_tables())[table_name.casefold()]
+        except KeyError:
+            raise ValueError(f"Unknown table: {table_name}") from None
+        return _quote_identifier(name)
+
+    async def table_info(self, table_name: str) -> List[Dict[str, Any]]:
+        """Return the column description of a table, like ``PRAGMA table_info``."""
+        return await self.execute_query(TABLE_INFO_QUERY, (table_name,))
+
+    async def sample_rows(self, table_name: str, limit: int) -> Dict[str, Any]:
+        """Return up to ``limit`` rows from a known table, in the ``execute_query_columns`` shape."""
+        table = await self.require_table(table_name)
+        return await self.execute_query_columns(f"SELECT * FROM {table} LIMIT ?", (limit,))
 
     async def init_db(self):
         """Initialize database with sample tables."""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._lock:
+            db = await self.connect()
+
             # Create users table
             await db.execute(
                 """
@@ -148,28 +426,211 @@ class DatabaseManager:
             )
 
             await db.commit()
+            self.invalidate_schema()
+            self._known_tables = None
 
     async def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """Execute a SELECT query and return results."""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.acquire_reader() as db:
+            async with db.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+                keys = tuple(column[0] for column in cursor.description or ())
+                return [dict(zip(keys, row)) for row in rows]
+
+    async def execute_query_columns(self, query: str, params: tuple = ()) -> Dict[str, Any]:
+        """Execute a SELECT query and return ``{"columns": [...], "rows": [...]}``.
+
+        Rows are the plain tuples sqlite3 returns, which avoids building a
+        dict per row and repeating every column name when serialized.
+        """
+        async with self.acquire_reader() as db:
             async with db.execute(query, params) as cursor:
                 rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+                columns = [column[0] for column in cursor.description or ()]
+                return {"columns": columns, "rows": rows}
 
     async def execute_write(self, query: str, params: tuple = ()) -> int:
         """Execute an INSERT/UPDATE/DELETE query and return affected rows."""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(query, params) as cursor:
+        async with self._lock:
+            db = await self.connect()
+            try:
+                async with db.execute(query, params) as cursor:
+                    await db.commit()
+                    return cursor.rowcount
+            except Exception:
+                # Don't leave a failed statement's transaction open on the shared connection
+                await db.rollback()
+                raise
+            finally:
+                # Writes may change row counts or, for DDL, the tables themselves
+                self.invalidate_schema()
+                if query.lstrip().upper().startswith(DDL_PREFIXES):
+                    self._known_tables = None
+
+    async def execute_many(self, query: str, seq_of_params: Iterable[tuple]) -> int:
+        """Execute a write statement for each parameter tuple in one transaction."""
+        return await self.execute_batch([(query, seq_of_params)])
+
+    async def execute_batch(self, batches: Sequence[Tuple[str, Iterable[tuple]]]) -> int:
+        """Execute several ``executemany`` batches and commit them together.
+
+        Returns the total number of affected rows.
+        """
+        async with self._lock:
+            db = await self.connect()
+            try:
+                total = 0
+                for query, seq_of_params in batches:
+                    async with db.executemany(query, seq_of_params) as cursor:
+                        total += cursor.rowcount
                 await db.commit()
-                return cursor.rowcount
+                return total
+            except Exception:
+                await db.rollback()
+                raise
+            finally:
+                self.invalidate_schema()
+
 
+def _has_multiple_statements(sql: str) -> bool:
+    """Return True if ``sql`` contains a second statement after a ``;``.
+
+    Comments and whitespace after the final ``;`` don't count as a statement.
+    """
+    return any(
+        match.group(1) and not _STATEMENT_TAIL_RE.match(sql, match.end())
+        for match in _STATEMENT_SEPARATOR_RE.finditer(sql)
+    )
+
+
+def _multi_row_insert(insert_sql: str, rows: Sequence[tuple]) -> Tuple[str, tuple]:
+    """Turn ``INSERT ... (cols)`` plus rows into one multi-row ``VALUES`` statement and flat params."""
+    placeholders = "(" + ", ".join("?" * len(rows[0])) + ")"
+    query = f"{insert_sql} VALUES {', '.join([placeholders] * len(rows))}"
+    return query, tuple(value for row in rows for value in row)
+
+
+# Sample rows used by insert_sample_data
+SAMPLE_USERS = [
+    ("John Doe", "john@example.com", 30),
+    ("Jane Smith", "jane@example.com", 25),
+]
+SAMPLE_PRODUCTS = [
+    ("Laptop", 999.99, "Electronics", 10),
+    ("Coffee Mug", 12.99, "Kitchen", 50),
+]
+# One statement per table, built once
+SAMPLE_INSERTS = [
+    _multi_row_insert("INSERT OR IGNORE INTO users (name, email, age)", SAMPLE_USERS),
+    _multi_row_insert("INSERT OR IGNORE INTO products (name, price, category, stock_quantity)", SAMPLE_PRODUCTS),
+]
 
 # Initialize clients
 ollama_client = OllamaLlamaIndexClient()
 db_manager = DatabaseManager()
 
 
+# Prompt construction
+#
+# Prompts put the fixed instructions and the schema/sample data first and the
+# caller's question last, so repeated questions about the same data share a
+# long identical prefix that Ollama (llama.cpp) can serve from its KV cache.
+
+
+ANALYSIS_INSTRUCTIONS = (
+    "You are a data analyst. Provide insights and analysis based on the data below. "
+    "If you need to suggest SQL queries, make sure they are SELECT queries only."
+)
+DATABASE_ANALYSIS_INSTRUCTIONS = (
+    "You are a database analyst with access to a SQLite database. Provide a comprehensive analysis. "
+    "If you suggest SQL queries, ensure they are SELECT statements only. "
+    "Include insights, patterns, and recommendations based on the data."
+)
+SQL_GENERATION_INSTRUCTIONS = (
+    "You are a SQL expert. Given the following database schema, generate a SQL query based on the user's request. "
+    "Generate only a SELECT SQL query that fulfills the request. Do not include explanations, just the SQL query. "
+    "Ensure the query is safe and only uses SELECT statements."
+)
+
+
+def _compact_json(data: Any) -> str:
+    """Serialize prompt data without indentation to keep prompts short."""
+    return orjson.dumps(data, default=str).decode()
+
+
+def _with_question(prefix: str, label: str, question: str) -> str:
+    """Append the caller's question to a prompt prefix."""
+    return "".join((prefix, "\n", label, ": ", question, "\n"))
+
+
+def _analysis_prefix(table_name: str, schema_json: str, sample_json: str) -> str:
+    """Build the fixed part of the single-table analysis prompt."""
+    return "\n".join(
+        (
+            ANALYSIS_INSTRUCTIONS,
+            "",
+            f"The database table '{table_name}' has the following schema:",
+            schema_json,
+            "",
+            "Here's a sample of the data:",
+            sample_json,
+            "",
+        )
+    )
+
+
+def _database_analysis_prefix(schema_info: str, sample_json: str) -> str:
+    """Build the fixed part of the whole-database analysis prompt."""
+    return "\n".join(
+        (DATABASE_ANALYSIS_INSTRUCTIONS, "", "Database Schema:", schema_info, "", "Sample Data:", sample_json, "")
+    )
+
+
+def _sql_generation_prefix(schema_info: str) -> str:
+    """Build the fixed part of the SQL generation prompt."""
+    return "\n".join((SQL_GENERATION_INSTRUCTIONS, "", "Database Schema:", schema_info, ""))
+
+
+def _progress_token(ctx: Optional[Context]) -> Optional[Union[str, int]]:
+    """Return the caller's progress token, or None without a live request or token.
+
+    FastMCP's ``Context.request_context`` raises ValueError outside a request,
+    e.g. when a tool is invoked through ``mcp.call_tool``.
+    """
+    if ctx is None:
+        return None
+    try:
+        meta = ctx.request_context.meta
+    except ValueError:
+        return None
+    return meta.progressToken if meta is not None else None
+
+
+async def _generate(model: str, prompt: str, ctx: Optional[Context] = None) -> str:
+    """Generate a tool's LLM response, streaming progress when the caller asked for it.
+
+    MCP tool results cannot be streamed, so when the request carries a
+    progress token the response is streamed from Ollama and each chunk is
+    forwarded as a progress notification while the full text is collected.
+
+    Also makes sure LlamaIndex is configured before the first LLM call.
+
+    Tools declare ``ctx: Context = None``: FastMCP only injects the context for
+    a bare ``Context`` annotation, and the default keeps direct calls working.
+    """
+    _ensure_llamaindex_configured()
+    if ctx is None or _progress_token(ctx) is None:
+        return await ollama_client.generate(model, prompt)
+
+    parts: List[str] = []
+    received = 0
+    async for delta in ollama_client.generate_stream(model, prompt):
+        parts.append(delta)
+        received += len(delta)
+        await ctx.report_progress(received, message=delta)
+    return "".join(parts)
+
+
 @mcp.tool()
 async def query_database(sql: str) -> str:
     """Execute a SQL query on the database.
@@ -178,9 +639,11 @@ async def query_database(sql: str) -> str:
         sql: The SQL query to execute (SELECT statements only for safety)
     """
     try:
-        # Basic safety check - only allow SELECT queries
-        if not sql.strip().upper().startswith("SELECT"):
+        # Basic safety check - only allow a single SELECT query
+        if not _SELECT_RE.match(sql):
             return "Error: Only SELECT queries are allowed for safety reasons."
+        if _has_multiple_statements(sql):
+            return "Error: Only a single SQL statement is allowed."
 
         results = await db_manager.execute_query(sql)
 
@@ -188,7 +651,7 @@ async def query_database(sql: str) -> str:
             return "Query executed successfully but returned no results."
 
         # Format results as JSON for better readability
-        return json.dumps(results, indent=2, default=str)
+        return orjson.dumps(results, option=orjson.OPT_INDENT_2, default=str).decode()
 
     except Exception as e:
         return f"Database error: {str(e)}"
@@ -198,25 +661,8 @@ async def query_database(sql: str) -> str:
 async def insert_sample_data() -> str:
     """Insert sample data into the database tables."""
     try:
-        # Insert sample users
-        await db_manager.execute_write(
-            "INSERT OR IGNORE INTO users (name, email, age) VALUES (?, ?, ?)", (
-                "John Doe", "john@example.com", 30)
-        )
-        await db_manager.execute_write(
-            "INSERT OR IGNORE INTO users (name, email, age) VALUES (?, ?, ?)", (
-                "Jane Smith", "jane@example.com", 25)
-        )
-
-        # Insert sample products
-        await db_manager.execute_write(
-            "INSERT OR IGNORE INTO products (name, price, category, stock_quantity) VALUES (?, ?, ?, ?)",
-            ("Laptop", 999.99, "Electronics", 10),
-        )
-        await db_manager.execute_write(
-            "INSERT OR IGNORE INTO products (name, price, category, stock_quantity) VALUES (?, ?, ?, ?)",
-            ("Coffee Mug", 12.99, "Kitchen", 50),
-        )
+        # Insert sample users and products with one statement each, in a single transaction
+        await db_manager.execute_batch([(query, [params]) for query, params in SAMPLE_INSERTS])
 
         return "Sample data inserted successfully!"
 
@@ -225,7 +671,9 @@ async def insert_sample_data() -> str:
 
 
 @mcp.tool()
-async def analyze_data_with_llm(table_name: str, question: str, model: str = DEFAULT_MODEL) -> str:
+async def analyze_data_with_llm(
+    table_name: str, question: str, model: str = DEFAULT_MODEL, ctx: Context = None  # type: ignore[assignment]
+) -> str:
     """Analyze database data using local LLM via Ollama.
 
     Args:
@@ -234,28 +682,15 @@ async def analyze_data_with_llm(table_name: str, question: str, model: str = DEF
         model: Ollama model to use (default: llama3.2)
     """
     try:
-        # First, get the table schema
-        schema_query = f"PRAGMA table_info({table_name})"
-        schema_results = await db_manager.execute_query(schema_query)
-
-        # Get sample data from the table
-        data_query = f"SELECT * FROM {table_name} LIMIT 10"
-        data_results = await db_manager.execute_query(data_query)
-
-        # Construct prompt for LLM
-        prompt = f"""
-        You are a data analyst. I have a database table called '{table_name}' with the following schema:
-        {json.dumps(schema_results, indent=2)}
-        
-        Here's a sample of the data:
-        {json.dumps(data_results, indent=2, default=str)}
-        
-        Question: {question}
-        
-        Please provide insights and analysis based on this data. If you need to suggest SQL queries, make sure they are SELECT queries only.
-        """
+        # Get the table schema and a sample of its data; unknown tables raise
+        data_results = await db_manager.sample_rows(table_name, 10)
+        schema_results = await db_manager.table_info(table_name)
+
+        # Construct prompt for LLM: fixed prefix first, question last
+        prefix = _analysis_prefix(table_name, _compact_json(schema_results), _compact_json(data_results))
+        prompt = _with_question(prefix, "Question", question)
 
-        response = await ollama_client.generate(model, prompt)
+        response = await _generate(model, prompt, ctx)
         return response
 
     except Exception as e:
@@ -263,7 +698,9 @@ async def analyze_data_with_llm(table_name: str, question: str, model: str = DEF
 
 
 @mcp.tool()
-async def chat_with_ollama(prompt: str, model: str = DEFAULT_MODEL) -> str:
+async def chat_with_ollama(
+    prompt: str, model: str = DEFAULT_MODEL, ctx: Context = None  # type: ignore[assignment]
+) -> str:
     """Chat with local LLM via Ollama.
 
     Args:
@@ -271,7 +708,7 @@ async def chat_with_ollama(prompt: str, model: str = DEFAULT_MODEL) -> str:
         model: Ollama model to use (default: llama3.2)
     """
     try:
-        response = await ollama_client.generate(model, prompt)
+        response = await _generate(model, prompt, ctx)
         return response
     except Exception as e:
         return f"Error communicating with Ollama: {str(e)}"
@@ -290,31 +727,48 @@ async def list_ollama_models() -> str:
         return f"Error listing models: {str(e)}"
 
 
+async def _count_rows(table_names: List[str]) -> Dict[str, int]:
+    """Count the rows of several tables with UNION ALL queries.
+
+    One statement per ``COUNT_ROWS_BATCH_SIZE`` tables replaces a COUNT(*)
+    round trip per table; SQLite answers each COUNT(*) from the table's
+    smallest b-tree.
+    """
+    tables = await asyncio.gather(*(db_manager.require_table(name) for name in table_names))
+    batches = []
+    for start in range(0, len(tables), COUNT_ROWS_BATCH_SIZE):
+        batch = tables[start : start + COUNT_ROWS_BATCH_SIZE]
+        query = " UNION ALL ".join(f"SELECT ? AS name, COUNT(*) AS count FROM {table}" for table in batch)
+        batches.append(db_manager.execute_query(query, tuple(table_names[start : start + COUNT_ROWS_BATCH_SIZE])))
+    results = await asyncio.gather(*batches)
+    return {row["name"]: row["count"] for rows in results for row in rows}
+
+
 @mcp.tool()
 async def get_database_schema() -> str:
     """Get the complete database schema with table information."""
     try:
-        # Get list of tables
-        tables_query = "SELECT name FROM sqlite_master WHERE type='table'"
-        tables = await db_manager.execute_query(tables_query)
-
-        schema_info = {}
+        # Serve the cached snapshot until a write invalidates it
+        cached = db_manager.get_schema_snapshot()
+        if cached is not None:
+            return cached
+        version = db_manager.schema_version
 
-        for table in tables:
-            table_name = table["name"]
-            # Get table schema
-            schema_query = f"PRAGMA table_info({table_name})"
-            schema = await db_manager.execute_query(schema_query)
+        # Get list of tables
+        table_names = await db_manager.known_tables()
 
-            # Get row count
-            count_query = f"SELECT COUNT(*) as count FROM {table_name}"
-            count_result = await db_manager.execute_query(count_query)
-            row_count = count_result[0]["count"] if count_result else 0
+        # Fetch every table's columns concurrently, and all row counts in one statement
+        schema_tasks = [db_manager.table_info(name) for name in table_names]
+        schemas, counts = await asyncio.gather(asyncio.gather(*schema_tasks), _count_rows(table_names))
 
+        schema_info = {}
+        for table_name, schema in zip(table_names, schemas):
             schema_info[table_name] = {
-                "columns": schema, "row_count": row_count}
+                "columns": schema, "row_count": counts.get(table_name, 0)}
 
-        return json.dumps(schema_info, indent=2)
+        snapshot = orjson.dumps(schema_info, option=orjson.OPT_INDENT_2, default=str).decode()
+        db_manager.set_schema_snapshot(version, snapshot)
+        return snapshot
 
     except Exception as e:
         return f"Error getting database schema: {str(e)}"
@@ -330,8 +784,10 @@ async def create_table(table_name: str, schema_sql: str) -> str:
     """
     try:
         # Basic validation
-        if not schema_sql.strip().upper().startswith("CREATE TABLE"):
+        if not _CREATE_TABLE_RE.match(schema_sql):
             return "Error: Only CREATE TABLE statements are allowed."
+        if _has_multiple_statements(schema_sql):
+            return "Error: Only a single SQL statement is allowed."
 
         await db_manager.execute_write(schema_sql)
         return f"Table '{table_name}' created successfully!"
@@ -341,7 +797,9 @@ async def create_table(table_name: str, schema_sql: str) -> str:
 
 
 @mcp.tool()
-async def chat_with_context(message: str, context: str = "", model: str = DEFAULT_MODEL) -> str:
+async def chat_with_context(
+    message: str, context: str = "", model: str = DEFAULT_MODEL, ctx: Context = None  # type: ignore[assignment]
+) -> str:
     """Chat with LlamaIndex Ollama LLM with additional context.
 
     Args:
@@ -355,14 +813,16 @@ async def chat_with_context(message: str, context: str = "", model: str = DEFAUL
         else:
             full_prompt = message
 
-        response = await ollama_client.generate(model, full_prompt)
+        response = await _generate(model, full_prompt, ctx)
         return response
     except Exception as e:
         return f"Error in chat with context: {str(e)}"
 
 
 @mcp.tool()
-async def analyze_database_with_llamaindex(question: str, model: str = DEFAULT_MODEL) -> str:
+async def analyze_database_with_llamaindex(
+    question: str, model: str = DEFAULT_MODEL, ctx: Context = None  # type: ignore[assignment]
+) -> str:
     """Use LlamaIndex to analyze the entire database and answer questions.
 
     Args:
@@ -374,37 +834,15 @@ async def analyze_database_with_llamaindex(question: str, model: str = DEFAULT_M
         schema_info = await get_database_schema()
 
         # Get sample data from all tables
-        tables_query = "SELECT name FROM sqlite_master WHERE type='table'"
-        tables = await db_manager.execute_query(tables_query)
-
-        all_data = {}
-        for table in tables:
-            table_name = table["name"]
-            sample_data = await db_manager.execute_query(f"SELECT * FROM {table_name} LIMIT 5")
-            all_data[table_name] = sample_data
-
-        # Create comprehensive context
-        context = f"""
-        Database Schema:
-        {schema_info}
-        
-        Sample Data:
-        {json.dumps(all_data, indent=2, default=str)}
-        """
+        table_names = await db_manager.known_tables()
+        samples = await asyncio.gather(*(db_manager.sample_rows(table_name, 5) for table_name in table_names))
+        all_data = dict(zip(table_names, samples))
 
-        # Use LlamaIndex for analysis
-        prompt = f"""
-        You are a database analyst with access to a SQLite database. 
-        
-        {context}
-        
-        Question: {question}
-        
-        Please provide a comprehensive analysis. If you suggest SQL queries, ensure they are SELECT statements only.
-        Include insights, patterns, and recommendations based on the data.
-        """
+        # Fixed schema/data prefix first, question last
+        prefix = _database_analysis_prefix(schema_info, _compact_json(all_data))
+        prompt = _with_question(prefix, "Question", question)
 
-        response = await ollama_client.generate(model, prompt)
+        response = await _generate(model, prompt, ctx)
         return response
     except Exception as e:
         return f"Error analyzing database with LlamaIndex: {str(e)}"
@@ -422,19 +860,9 @@ async def generate_sql_with_llamaindex(description: str, model: str = DEFAULT_MO
         # Get database schema
         schema_info = await get_database_schema()
 
-        prompt = f"""
-        You are a SQL expert. Given the following database schema, generate a SQL query based on the user's description.
-        
-        Database Schema:
-        {schema_info}
-        
-        User Request: {description}
-        
-        Generate only a SELECT SQL query that fulfills the request. Do not include explanations, just the SQL query.
-        Ensure the query is safe and only uses SELECT statements.
-        """
+        prompt = _with_question(_sql_generation_prefix(schema_info), "User Request", description)
 
-        sql_query = await ollama_client.generate(model, prompt)
+        sql_query = await _generate(model, prompt)
 
         # Clean up the response to extract just the SQL
         sql_query = sql_query.strip()
@@ -453,9 +881,26 @@ async def main():
     # Initialize database
     await db_manager.init_db()
 
-    # Run the server
-    await mcp.run_stdio_async()
+    try:
+        # Run the server
+        await mcp.run_stdio_async()
+    finally:
+        await db_manager.close()
+        await ollama_client.aclose()
+
+
+def sync_main() -> None:
+    """Synchronous entry point used by the console script.
+
+    Runs on uvloop when it is installed (``pip install .[uvloop]``).
+    """
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sync_main()
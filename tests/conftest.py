@@ -2,78 +2,84 @@
 Test configuration and fixtures for MCP Simple DB Access Server tests.
 """
 
-from mcp_simple_db_access.server import (
-    DatabaseManager,
-    OllamaLlamaIndexClient,
-    mcp,
-    get_ollama_llm,
-)
+from __future__ import annotations
+
 import asyncio
-import json
+import os
+import shutil
+import sqlite3
 import tempfile
+from contextlib import closing
 from pathlib import Path
-from typing import AsyncGenerator, Dict, Any
+from types import ModuleType
+from typing import TYPE_CHECKING, AsyncGenerator, Dict, Any, Generator, Tuple
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 import pytest_asyncio
-import aiosqlite
-from mcp import ClientSession, ServerSession
-from mcp.server.stdio import stdio_server
-from mcp.types import Tool
 
-# Import our server components
-import sys
+if TYPE_CHECKING:
+    from mcp.types import Tool
+    from mcp_simple_db_access.server import DatabaseManager
+
 
-sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+@pytest.fixture(scope="session")
+def event_loop_policy() -> asyncio.AbstractEventLoopPolicy:
+    """Run async tests on uvloop where it is installed, else on the default loop."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
 
 
 @pytest.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
+def server_mod() -> ModuleType:
+    """The server module, imported on first use rather than at collection.
 
+    Importing it pulls in FastMCP and LlamaIndex, which test files that
+    don't touch the server (e.g. test_examples.py) shouldn't pay for.
+    """
+    import mcp_simple_db_access.server as server
 
-@pytest_asyncio.fixture
-async def temp_db() -> AsyncGenerator[str, None]:
-    """Create a temporary database for testing."""
-    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
-        temp_db_path = f.name
+    return server
 
-    # Initialize the test database
-    db_manager = DatabaseManager(temp_db_path)
-    await db_manager.init_db()
 
-    yield temp_db_path
+@pytest_asyncio.fixture(scope="session")
+async def registered_tools(server_mod: ModuleType) -> Tuple[Tool, ...]:
+    """Tools as listed by the MCP server.
 
-    # Cleanup
-    Path(temp_db_path).unlink(missing_ok=True)
+    The registry is fixed once the server module is imported, so it is listed
+    once per session and returned as a tuple that tests cannot mutate.
+    """
+    return tuple(await server_mod.mcp.list_tools())
 
 
-@pytest_asyncio.fixture
-async def db_manager(temp_db: str) -> DatabaseManager:
-    """Create a DatabaseManager instance with test database."""
-    return DatabaseManager(temp_db)
+EXAMPLES_PATH = Path(__file__).parent.parent / "examples"
 
 
-@pytest.fixture
-def mock_ollama_client():
-    """Mock Ollama client for testing without requiring Ollama to be running."""
-    client = MagicMock(spec=OllamaLlamaIndexClient)
+@pytest.fixture(scope="session")
+def example_sources() -> Dict[str, str]:
+    """Text of every example script and README, read from disk once per session."""
+    with os.scandir(EXAMPLES_PATH) as entries:
+        return {
+            entry.name: Path(entry.path).read_text()
+            for entry in entries
+            if entry.is_file() and entry.name.endswith((".py", ".md"))
+        }
 
-    # Mock async methods
-    client.generate = AsyncMock(return_value="Mock LLM response")
-    client.list_models = AsyncMock(return_value=["llama3.2", "gemma2"])
-    client.chat = AsyncMock(return_value="Mock chat response")
 
-    return client
+# Memory-backed tmpfs where the platform has one, so test databases never hit disk
+TEST_DB_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
 
+# Template databases built next to the session database and restored over it
+EMPTY_DB_NAME = "empty.db"
+SEEDED_DB_NAME = "seeded.db"
+POPULATED_DB_NAME = "populated.db"
 
-@pytest_asyncio.fixture
-async def populated_db(db_manager: DatabaseManager) -> DatabaseManager:
-    """Database manager with sample data inserted."""
+
+async def _insert_test_rows(db_manager: DatabaseManager) -> None:
+    """Insert the users, products and order that populated_db tests expect."""
     # Insert test users
     await db_manager.execute_write(
         "INSERT INTO users (name, email, age) VALUES (?, ?, ?)", (
@@ -100,7 +106,127 @@ async def populated_db(db_manager: DatabaseManager) -> DatabaseManager:
             1, 1, 2, 199.98)
     )
 
-    return db_manager
+
+@pytest.fixture(scope="session")
+def session_db(server_mod: ModuleType) -> Generator[str, None, None]:
+    """Create one database file per test session (per xdist worker), plus its templates."""
+    # A private directory keeps parallel workers apart and collects the WAL side files
+    temp_dir = tempfile.mkdtemp(prefix="mcp-db-test-", dir=TEST_DB_ROOT)
+    temp_db_path = str(Path(temp_dir) / "test.db")
+
+    async def init() -> None:
+        # Freshly initialized schema, restored before every test
+        async with server_mod.DatabaseManager(str(Path(temp_dir) / EMPTY_DB_NAME)) as db_manager:
+            await db_manager.init_db()
+        # Same schema holding the sample data, restored by the seeded_db fixture
+        async with server_mod.DatabaseManager(str(Path(temp_dir) / SEEDED_DB_NAME)) as db_manager:
+            await db_manager.init_db()
+            with patch.object(server_mod, "db_manager", db_manager):
+                await server_mod.insert_sample_data()
+        # Same schema holding the test rows, restored by the populated_db fixture
+        async with server_mod.DatabaseManager(str(Path(temp_dir) / POPULATED_DB_NAME)) as db_manager:
+            await db_manager.init_db()
+            await _insert_test_rows(db_manager)
+
+    # A private loop: asyncio.run() would clear the session loop if it is already running tests
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(init())
+    finally:
+        loop.close()
+    _restore_database(temp_db_path, EMPTY_DB_NAME)
+
+    yield temp_db_path
+
+    # Cleanup
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _restore_database(db_path: str, template_name: str) -> None:
+    """Overwrite the database with the named template from the same directory.
+
+    SQLite's backup API copies the template page by page, which also carries
+    over anything still in its WAL and leaves no stale tables behind.
+    """
+    template_path = str(Path(db_path).with_name(template_name))
+    with closing(sqlite3.connect(template_path)) as source, closing(sqlite3.connect(db_path)) as target:
+        source.backup(target)
+
+
+@pytest.fixture
+def temp_db(session_db: str) -> str:
+    """Path to the session test database, reset to empty tables for this test."""
+    _restore_database(session_db, EMPTY_DB_NAME)
+    return session_db
+
+
+@pytest.fixture
+def seeded_db(temp_db: str) -> str:
+    """Path to the test database with the sample data already inserted."""
+    _restore_database(temp_db, SEEDED_DB_NAME)
+    return temp_db
+
+
+@pytest_asyncio.fixture
+async def db_manager(temp_db: str, server_mod: ModuleType) -> AsyncGenerator[DatabaseManager, None]:
+    """Create a DatabaseManager instance with test database."""
+    async with server_mod.DatabaseManager(temp_db) as manager:
+        yield manager
+
+
+@pytest_asyncio.fixture
+async def seeded_db_manager(seeded_db: str, server_mod: ModuleType) -> AsyncGenerator[DatabaseManager, None]:
+    """DatabaseManager over the test database with the sample data inserted."""
+    async with server_mod.DatabaseManager(seeded_db) as manager:
+        yield manager
+
+
+@pytest.fixture(scope="session")
+def shared_ollama_client(server_mod: ModuleType):
+    """Mock Ollama client shared by the session; use ``mock_ollama_client`` in tests."""
+    return MagicMock(spec=server_mod.OllamaLlamaIndexClient)
+
+
+@pytest.fixture
+def mock_ollama_client(shared_ollama_client):
+    """Mock Ollama client for testing without requiring Ollama to be running.
+
+    generate() answers "Mock LLM response" and list_models() returns two
+    models unless a test sets its own values.
+    """
+    client = shared_ollama_client
+    client.reset_mock(return_value=True, side_effect=True)
+
+    # The spec already made the async methods AsyncMocks; only their defaults need restoring
+    client.generate.return_value = "Mock LLM response"
+    client.list_models.return_value = ["llama3.2", "gemma2"]
+    client.chat.return_value = "Mock chat response"
+
+    return client
+
+
+@pytest_asyncio.fixture
+async def populated_db(temp_db: str, server_mod: ModuleType) -> AsyncGenerator[DatabaseManager, None]:
+    """Database manager over the test database with the test rows inserted.
+
+    The rows come from a template built once per session, restored before
+    the manager opens its connections.
+    """
+    _restore_database(temp_db, POPULATED_DB_NAME)
+    async with server_mod.DatabaseManager(temp_db) as manager:
+        yield manager
+
+
+@pytest_asyncio.fixture(scope="session")
+async def populated_schema_json(session_db: str, server_mod: ModuleType) -> str:
+    """get_database_schema output for the populated_db rows, built once per session.
+
+    Read straight from the populated template, which tests never write to.
+    """
+    template_path = str(Path(session_db).with_name(POPULATED_DB_NAME))
+    async with server_mod.DatabaseManager(template_path) as manager:
+        with patch.object(server_mod, "db_manager", manager):
+            return await server_mod.get_database_schema()
 
 
 @pytest.fixture
@@ -3,6 +3,7 @@ Tests for DatabaseManager class.
 """
 
 import pytest
+import asyncio
 import json
 from mcp_simple_db_access.server import DatabaseManager
 
@@ -10,21 +11,19 @@ from mcp_simple_db_access.server import DatabaseManager
 class TestDatabaseManager:
     """Test cases for DatabaseManager functionality."""
 
-    @pytest.mark.asyncio
     async def test_init_db(self, temp_db):
         """Test database initialization creates all required tables."""
-        db_manager = DatabaseManager(temp_db)
-        await db_manager.init_db()
+        async with DatabaseManager(temp_db) as db_manager:
+            await db_manager.init_db()
 
-        # Check that all tables were created
-        tables = await db_manager.execute_query("SELECT name FROM sqlite_master WHERE type='table'")
+            # Check that all tables were created
+            tables = await db_manager.execute_query("SELECT name FROM sqlite_master WHERE type='table'")
         table_names = [table["name"] for table in tables]
 
         assert "users" in table_names
         assert "products" in table_names
         assert "orders" in table_names
 
-    @pytest.mark.asyncio
     async def test_execute_query_select(self, populated_db):
         """Test executing SELECT queries."""
         # Test basic SELECT
@@ -38,13 +37,11 @@ class TestDatabaseManager:
         assert len(result) == 1
         assert result[0]["name"] == "Test User 2"
 
-    @pytest.mark.asyncio
     async def test_execute_query_empty_result(self, populated_db):
         """Test query that returns no results."""
         result = await populated_db.execute_query("SELECT * FROM users WHERE age > 100")
         assert result == []
 
-    @pytest.mark.asyncio
     async def test_execute_write_insert(self, db_manager):
         """Test INSERT operations."""
         # Insert a user
@@ -58,7 +55,6 @@ class TestDatabaseManager:
         assert len(result) == 1
         assert result[0]["name"] == "New User"
 
-    @pytest.mark.asyncio
     async def test_execute_write_update(self, populated_db):
         """Test UPDATE operations."""
         # Update a user's age
@@ -69,7 +65,6 @@ class TestDatabaseManager:
         result = await populated_db.execute_query("SELECT age FROM users WHERE name = ?", ("Test User 1",))
         assert result[0]["age"] == 26
 
-    @pytest.mark.asyncio
     async def test_execute_write_delete(self, populated_db):
         """Test DELETE operations."""
         # Delete a user
@@ -80,7 +75,6 @@ class TestDatabaseManager:
         result = await populated_db.execute_query("SELECT * FROM users WHERE name = ?", ("Test User 1",))
         assert len(result) == 0
 
-    @pytest.mark.asyncio
     async def test_foreign_key_constraint(self, populated_db):
         """Test that foreign key relationships work correctly."""
         # Get order data with JOIN
@@ -98,7 +92,6 @@ class TestDatabaseManager:
         assert result[0]["product_name"] == "Test Product 1"
         assert result[0]["quantity"] == 2
 
-    @pytest.mark.asyncio
     async def test_transaction_rollback(self, db_manager):
         """Test that transactions work correctly on errors."""
         # This should work
@@ -118,7 +111,6 @@ class TestDatabaseManager:
         assert len(result) == 1
         assert result[0]["name"] == "User 1"
 
-    @pytest.mark.asyncio
     async def test_parameterized_queries_prevent_injection(self, db_manager):
         """Test that parameterized queries prevent SQL injection."""
         # Insert a user first
@@ -137,7 +129,6 @@ class TestDatabaseManager:
         tables = await db_manager.execute_query("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
         assert len(tables) == 1
 
-    @pytest.mark.asyncio
     async def test_row_factory_returns_dict(self, populated_db):
         """Test that queries return dictionary-like rows."""
         result = await populated_db.execute_query("SELECT * FROM users LIMIT 1")
@@ -153,3 +144,103 @@ class TestDatabaseManager:
 
         # Should be a dictionary
         assert isinstance(row, dict)
+
+    async def test_connection_is_reused(self, db_manager):
+        """Test that queries share one connection until it is closed."""
+        connection = await db_manager.connect()
+
+        await db_manager.execute_query("SELECT * FROM users")
+        await db_manager.execute_write(
+            "INSERT INTO users (name, email, age) VALUES (?, ?, ?)", ("Reuse", "reuse@example.com", 40)
+        )
+        assert await db_manager.connect() is connection
+
+        # Closing drops the connection; the next query reopens it transparently
+        await db_manager.close()
+        result = await db_manager.execute_query("SELECT * FROM users")
+        assert len(result) == 1
+        assert await db_manager.connect() is not connection
+
+    async def test_connection_pragmas(self, db_manager):
+        """Test that new connections use WAL journaling."""
+        result = await db_manager.execute_query("PRAGMA journal_mode")
+        assert result[0]["journal_mode"] == "wal"
+
+    async def test_concurrent_reads_use_pool(self, populated_db):
+        """Test that concurrent SELECTs are served by the read-only pool."""
+        results = await asyncio.gather(*(populated_db.execute_query("SELECT * FROM users") for _ in range(10)))
+
+        assert all(len(result) == 2 for result in results)
+        assert len(populated_db._readers) == populated_db.read_pool_size
+
+        # Pooled readers refuse writes
+        async with populated_db.acquire_reader() as reader:
+            with pytest.raises(Exception):
+                await reader.execute("DELETE FROM users")
+
+    async def test_execute_many(self, db_manager):
+        """Test inserting several rows in one transaction."""
+        rows_affected = await db_manager.execute_many(
+            "INSERT INTO users (name, email, age) VALUES (?, ?, ?)",
+            [("User A", "a@example.com", 20), ("User B", "b@example.com", 21)],
+        )
+        assert rows_affected == 2
+
+        result = await db_manager.execute_query("SELECT name FROM users ORDER BY id")
+        assert [row["name"] for row in result] == ["User A", "User B"]
+
+    async def test_execute_batch_rolls_back_on_error(self, db_manager):
+        """Test that a failing batch leaves no partial writes behind."""
+        with pytest.raises(Exception):
+            await db_manager.execute_batch(
+                [
+                    ("INSERT INTO users (name, email, age) VALUES (?, ?, ?)", [("User A", "a@example.com", 20)]),
+                    ("INSERT INTO users (name, email, age) VALUES (?, ?, ?)", [("User B", "a@example.com", 21)]),
+                ]
+            )
+
+        result = await db_manager.execute_query("SELECT * FROM users")
+        assert result == []
+
+    async def test_connect_creates_database_directory(self, tmp_path):
+        """Test that the database directory is created when the first connection opens."""
+        db_path = tmp_path / "nested" / "app.db"
+
+        async with DatabaseManager(str(db_path)) as db_manager:
+            await db_manager.init_db()
+
+        assert db_path.exists()
+
+    async def test_execute_query_columns(self, populated_db):
+        """Test the columnar result shape."""
+        result = await populated_db.execute_query_columns(
+            "SELECT name, age FROM users WHERE age > ? ORDER BY id", (20,)
+        )
+
+        assert result == {"columns": ["name", "age"], "rows": [("Test User 1", 25), ("Test User 2", 30)]}
+
+        # Regular queries on the same pooled connections still return dicts
+        rows = await populated_db.execute_query("SELECT name FROM users ORDER BY id")
+        assert rows[0]["name"] == "Test User 1"
+
+    async def test_known_tables_refresh_after_ddl(self, db_manager):
+        """Test that the table whitelist picks up tables created later."""
+        assert await db_manager.known_tables() == ["users", "products", "orders"]
+        with pytest.raises(ValueError, match="Unknown table"):
+            await db_manager.sample_rows("reviews", 5)
+
+        await db_manager.execute_write("CREATE TABLE reviews (id INTEGER PRIMARY KEY, body TEXT)")
+        await db_manager.execute_write("INSERT INTO reviews (body) VALUES (?)", ("Great",))
+
+        assert "reviews" in await db_manager.known_tables()
+        assert await db_manager.sample_rows("reviews", 5) == {"columns": ["id", "body"], "rows": [(1, "Great")]}
+        columns = await db_manager.table_info("reviews")
+        assert [column["name"] for column in columns] == ["id", "body"]
+
+    async def test_require_table_ignores_case(self, db_manager):
+        """Test that table names match case-insensitively, like SQLite identifiers."""
+        await db_manager.execute_write('CREATE TABLE "Reviews" (id INTEGER PRIMARY KEY)')
+
+        assert await db_manager.require_table("USERS") == '"users"'
+        assert await db_manager.require_table("reviews") == '"Reviews"'
+        assert "Reviews" in await db_manager.known_tables()
@@ -4,20 +4,82 @@ Tests for example client scripts.
 
 import pytest
 import asyncio
-import sys
+import re
+from contextlib import asynccontextmanager
 from pathlib import Path
-from unittest.mock import AsyncMock, MagicMock, patch
-from mcp import ClientSession
-
-# Add examples to path
-examples_path = Path(__file__).parent.parent / "examples"
-sys.path.insert(0, str(examples_path))
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+from unittest.mock import AsyncMock
+import anyio
+import orjson
+
+# Example scripts; the directory is importable via pytest's pythonpath setting
+EXAMPLES_DIR = Path(__file__).parent.parent / "examples"
+
+EXAMPLE_FILES = ("simple_client.py", "client_example.py", "llamaindex_example.py")
+
+# Required pieces of every example script, one named group each
+EXAMPLE_STRUCTURE_RE = re.compile(
+    r"(?P<asyncio_import>import asyncio)"
+    r"|(?P<shared_session_import>from _session import shared_session)"
+    r"|(?P<main_guard>if __name__ == \"__main__\":)"
+    r"|(?P<asyncio_run>asyncio\.run\()"
+)
+
+# Response shapes the examples parse
+EXAMPLE_JSON_RESPONSES = (
+    '{"users": [{"name": "John", "age": 30}]}',
+    '[{"id": 1, "name": "Test"}]',
+    '{"tables": {"users": {"row_count": 5}}}',
+)
+
+# Tool calls made by the examples
+EXAMPLE_TOOL_CALLS = (
+    ("insert_sample_data", {}),
+    ("query_database", {"sql": "SELECT * FROM users"}),
+    ("get_database_schema", {}),
+    ("chat_with_ollama", {"prompt": "Hello", "model": "llama3.2"}),
+    ("list_ollama_models", {}),
+    (
+        "analyze_data_with_llm",
+        {"table_name": "users", "question": "What patterns do you see?", "model": "llama3.2"},
+    ),
+    ("generate_sql_with_llamaindex", {"description": "Find users older than 25", "model": "llama3.2"}),
+    ("chat_with_context", {"message": "Hello", "context": "Database context", "model": "llama3.2"}),
+    ("analyze_database_with_llamaindex", {"question": "What insights can you provide?", "model": "llama3.2"}),
+)
+
+
+# Static list_tools and call_tool responses for _StubSession
+STUB_TOOLS_RESPONSE = SimpleNamespace(
+    tools=(SimpleNamespace(name="query_database", description="Execute SQL queries"),)
+)
+STUB_CALL_RESULT = SimpleNamespace(content=(SimpleNamespace(text='{"result": "success"}'),))
+
+
+class _StubSession:
+    """Minimal stand-in for the ClientSession methods the examples call."""
+
+    def __init__(self, tools: Any = None, result: Any = None, error: Optional[Exception] = None):
+        self._tools = tools
+        self._result = result
+        self._error = error
+
+    async def initialize(self) -> None:
+        pass
+
+    async def list_tools(self) -> Any:
+        return self._tools
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Any:
+        if self._error is not None:
+            raise self._error
+        return self._result
 
 
 class TestExampleClients:
     """Test cases for example client scripts."""
 
-    @pytest.mark.asyncio
     async def test_simple_client_imports(self):
         """Test that simple client can be imported without errors."""
         try:
@@ -27,7 +89,6 @@ class TestExampleClients:
         except ImportError as e:
             pytest.fail(f"Failed to import simple_client: {e}")
 
-    @pytest.mark.asyncio
     async def test_client_example_imports(self):
         """Test that client example can be imported without errors."""
         try:
@@ -38,7 +99,6 @@ class TestExampleClients:
         except ImportError as e:
             pytest.fail(f"Failed to import client_example: {e}")
 
-    @pytest.mark.asyncio
     async def test_llamaindex_example_imports(self):
         """Test that LlamaIndex example can be imported without errors."""
         try:
@@ -48,63 +108,36 @@ class TestExampleClients:
         except ImportError as e:
             pytest.fail(f"Failed to import llamaindex_example: {e}")
 
-    @pytest.mark.asyncio
     async def test_mock_client_session_functionality(self):
         """Test mock client session functionality used in examples."""
+        session = _StubSession(tools=STUB_TOOLS_RESPONSE, result=STUB_CALL_RESULT)
 
-        # Create a mock session
-        mock_session = MagicMock(spec=ClientSession)
-
-        # Mock the methods used in examples
-        mock_session.initialize = AsyncMock()
-        mock_session.list_tools = AsyncMock()
-        mock_session.call_tool = AsyncMock()
-
-        # Mock list_tools response
-        mock_tool = MagicMock()
-        mock_tool.name = "query_database"
-        mock_tool.description = "Execute SQL queries"
-        mock_tools_response = MagicMock()
-        mock_tools_response.tools = [mock_tool]
-        mock_session.list_tools.return_value = mock_tools_response
-
-        # Mock call_tool response
-        mock_content = MagicMock()
-        mock_content.text = '{"result": "success"}'
-        mock_result = MagicMock()
-        mock_result.content = [mock_content]
-        mock_session.call_tool.return_value = mock_result
-
-        # Test the mock functionality
-        await mock_session.initialize()
-        tools = await mock_session.list_tools()
-        result = await mock_session.call_tool("query_database", {"sql": "SELECT 1"})
+        # Test the stub functionality
+        await session.initialize()
+        tools = await session.list_tools()
+        result = await session.call_tool("query_database", {"sql": "SELECT 1"})
 
         assert len(tools.tools) == 1
         assert tools.tools[0].name == "query_database"
         assert result.content[0].text == '{"result": "success"}'
 
-    @pytest.mark.asyncio
     async def test_example_error_handling_patterns(self):
         """Test the error handling patterns used in examples."""
-
-        # Mock a session that raises errors
-        mock_session = MagicMock(spec=ClientSession)
-        mock_session.call_tool = AsyncMock(side_effect=Exception("Connection failed"))
+        # Stub a session that raises errors
+        session = _StubSession(error=Exception("Connection failed"))
 
         # Test that error handling would work
         try:
-            await mock_session.call_tool("test_tool", {})
+            await session.call_tool("test_tool", {})
             pytest.fail("Should have raised an exception")
         except Exception as e:
             assert "Connection failed" in str(e)
 
-    def test_example_readme_exists(self):
+    def test_example_readme_exists(self, example_sources):
         """Test that examples README exists and contains expected content."""
-        readme_path = examples_path / "README.md"
-        assert readme_path.exists(), "Examples README.md missing"
+        assert "README.md" in example_sources, "Examples README.md missing"
 
-        content = readme_path.read_text()
+        content = example_sources["README.md"]
 
         # Check for key sections
         assert "Prerequisites" in content
@@ -113,17 +146,93 @@ class TestExampleClients:
         assert "llamaindex_example.py" in content
         assert "Troubleshooting" in content
 
-    def test_example_files_executable(self):
+    @pytest.mark.parametrize("filename", EXAMPLE_FILES, ids=EXAMPLE_FILES)
+    def test_example_files_executable(self, filename):
         """Test that example Python files are executable."""
-        example_files = ["simple_client.py", "client_example.py", "llamaindex_example.py"]
+        file_path = EXAMPLES_DIR / filename
+        assert file_path.is_file(), f"Example file {filename} missing"
+
+        # Check if file has shebang; only the first line matters, so skip decoding the rest
+        with open(file_path, "rb") as f:
+            head = f.read(32)
+        assert head.startswith(b"#!/usr/bin/env python3"), f"Example file {filename} missing shebang"
+
+    def test_shared_session_module_structure(self, example_sources):
+        """Test that the shared session helper exposes the connection setup."""
+        import _session
+
+        content = example_sources["_session.py"]
+
+        assert "from mcp import ClientSession" in content
+        assert "from mcp.client.stdio import" in content
+        assert hasattr(_session, "shared_session")
+        assert _session.SERVER_PARAMS.args[0].endswith("run_server.py")
+
+    async def test_shared_session_across_tasks(self, monkeypatch):
+        """Test that the session can be shared by tasks that leave in any order."""
+        import _session
+
+        opened = []
+
+        @asynccontextmanager
+        async def fake_stdio_client(server_params):
+            # Like the real transport, the connection lives in a task group's cancel scope
+            async with anyio.create_task_group():
+                opened.append(server_params)
+                yield None, None
+
+        @asynccontextmanager
+        async def fake_client_session(read, write):
+            yield _StubSession()
+
+        monkeypatch.setattr(_session, "stdio_client", fake_stdio_client)
+        monkeypatch.setattr(_session, "ClientSession", fake_client_session)
+
+        first_entered = asyncio.Event()
+        first_left = asyncio.Event()
+
+        async def first_user():
+            async with _session.shared_session() as session:
+                first_entered.set()
+                await asyncio.sleep(0)
+            first_left.set()
+            return session
 
-        for filename in example_files:
-            file_path = examples_path / filename
-            assert file_path.exists(), f"Example file {filename} missing"
+        async def last_user():
+            await first_entered.wait()
+            async with _session.shared_session() as session:
+                await first_left.wait()
+            return session
 
-            # Check if file has shebang
-            content = file_path.read_text()
-            assert content.startswith("#!/usr/bin/env python3"), f"Example file {filename} missing shebang"
+        first, last = await asyncio.gather(first_user(), last_user())
+
+        assert first is last
+        assert len(opened) == 1
+        assert _session._session is None
+
+    @pytest.mark.parametrize("verb", ["chat", "sql"])
+    async def test_interactive_commands_require_argument(self, verb, capsys):
+        """Test that chat and sql without an argument print usage instead of calling a tool."""
+        from client_example import HANDLERS
+
+        session = AsyncMock()
+        await HANDLERS[verb](session, "")
+
+        session.call_tool.assert_not_called()
+        assert f"Usage: {verb} <" in capsys.readouterr().out
+
+    def test_extract_text_content(self):
+        """Test text extraction from tool results used in examples."""
+        from mcp.types import CallToolResult, ImageContent, TextContent
+        from utilities import extract_text_content
+
+        text_result = CallToolResult(content=[TextContent(type="text", text="hello")])
+        image_result = CallToolResult(content=[ImageContent(type="image", data="", mimeType="image/png")])
+        empty_result = CallToolResult(content=[])
+
+        assert extract_text_content(text_result) == "hello"
+        assert extract_text_content(image_result) == ""
+        assert extract_text_content(empty_result) == ""
 
     def test_example_parameter_validation(self):
         """Test parameter structures used in examples."""
@@ -137,75 +246,37 @@ class TestExampleClients:
         assert params.command == "python"
         assert params.args == ["test_script.py"]
 
-    @pytest.mark.asyncio
-    async def test_example_tool_calls_structure(self):
+    @pytest.mark.parametrize("tool_name,params", EXAMPLE_TOOL_CALLS, ids=[name for name, _ in EXAMPLE_TOOL_CALLS])
+    async def test_example_tool_calls_structure(self, tool_name, params):
         """Test the structure of tool calls used in examples."""
-
-        # Define the tool calls used in examples
-        example_tool_calls = [
-            ("insert_sample_data", {}),
-            ("query_database", {"sql": "SELECT * FROM users"}),
-            ("get_database_schema", {}),
-            ("chat_with_ollama", {"prompt": "Hello", "model": "llama3.2"}),
-            ("list_ollama_models", {}),
-            (
-                "analyze_data_with_llm",
-                {"table_name": "users", "question": "What patterns do you see?", "model": "llama3.2"},
-            ),
-            ("generate_sql_with_llamaindex", {"description": "Find users older than 25", "model": "llama3.2"}),
-            ("chat_with_context", {"message": "Hello", "context": "Database context", "model": "llama3.2"}),
-            ("analyze_database_with_llamaindex", {"question": "What insights can you provide?", "model": "llama3.2"}),
-        ]
-
-        # Verify each tool call structure
-        for tool_name, params in example_tool_calls:
-            assert isinstance(tool_name, str), f"Tool name should be string: {tool_name}"
-            assert isinstance(params, dict), f"Params should be dict: {params}"
-
-            # Check specific parameter types
-            if "sql" in params:
-                assert isinstance(params["sql"], str)
-            if "model" in params:
-                assert isinstance(params["model"], str)
-            if "prompt" in params:
-                assert isinstance(params["prompt"], str)
-
-    def test_example_imports_structure(self):
+        assert isinstance(tool_name, str), f"Tool name should be string: {tool_name}"
+        assert isinstance(params, dict), f"Params should be dict: {params}"
+
+        # Check specific parameter types
+        if "sql" in params:
+            assert isinstance(params["sql"], str)
+        if "model" in params:
+            assert isinstance(params["model"], str)
+        if "prompt" in params:
+            assert isinstance(params["prompt"], str)
+
+    @pytest.mark.parametrize("filename", EXAMPLE_FILES, ids=EXAMPLE_FILES)
+    def test_example_imports_structure(self, example_sources, filename):
         """Test that examples have the correct import structure."""
+        content = example_sources[filename]
 
-        # Read each example file and check imports
-        example_files = ["simple_client.py", "client_example.py", "llamaindex_example.py"]
-
-        for filename in example_files:
-            file_path = examples_path / filename
-            content = file_path.read_text()
-
-            # Should have these essential imports
-            assert "import asyncio" in content, f"{filename} missing asyncio import"
-            assert "from mcp import ClientSession" in content, f"{filename} missing ClientSession import"
-            assert "from mcp.client.stdio import" in content, f"{filename} missing stdio import"
+        # Essential imports, the main execution guard and asyncio.run, found in one pass
+        seen = {match.lastgroup for match in EXAMPLE_STRUCTURE_RE.finditer(content)}
+        missing = set(EXAMPLE_STRUCTURE_RE.groupindex) - seen
+        assert not missing, f"{filename} missing: {', '.join(sorted(missing))}"
 
-            # Should have main execution guard
-            assert 'if __name__ == "__main__":' in content, f"{filename} missing main guard"
-            assert "asyncio.run(" in content, f"{filename} missing asyncio.run"
-
-    def test_example_json_handling(self):
+    @pytest.mark.parametrize("response", EXAMPLE_JSON_RESPONSES)
+    def test_example_json_handling(self, response):
         """Test JSON handling patterns used in examples."""
-        import json
-
-        # Test the JSON parsing patterns used in examples
-        test_responses = [
-            '{"users": [{"name": "John", "age": 30}]}',
-            '[{"id": 1, "name": "Test"}]',
-            '{"tables": {"users": {"row_count": 5}}}',
-        ]
-
-        for response in test_responses:
-            # Should not raise an error
-            parsed = json.loads(response)
-            assert isinstance(parsed, (dict, list))
+        # The examples parse tool responses with orjson; this should not raise an error
+        parsed = orjson.loads(response)
+        assert isinstance(parsed, (dict, list))
 
-    @pytest.mark.asyncio
     async def test_example_async_patterns(self):
         """Test async patterns used in examples."""
 
@@ -11,292 +11,261 @@ from mcp import ClientSession, ServerSession
 from mcp.server.stdio import stdio_server
 from mcp.client.stdio import stdio_client, StdioServerParameters
 
-from mcp_simple_db_access.server import mcp, main
+
+# Tools the server must register
+EXPECTED_TOOLS = (
+    "query_database",
+    "insert_sample_data",
+    "analyze_data_with_llm",
+    "chat_with_ollama",
+    "list_ollama_models",
+    "get_database_schema",
+    "create_table",
+    "chat_with_context",
+    "analyze_database_with_llamaindex",
+    "generate_sql_with_llamaindex",
+)
+# Write and stacked statements that query_database must refuse
+MALICIOUS_QUERIES = (
+    "DELETE FROM users",
+    "DROP TABLE users",
+    "UPDATE users SET age = 100",
+    "SELECT * FROM users; DROP TABLE users",
+)
+# Prefixes of query_database's rejection messages
+ERROR_PREFIXES = ("Error: Only SELECT queries are allowed", "Error: Only a single SQL statement is allowed")
+
+
+@pytest.fixture(scope="module")
+def tool_dict(registered_tools):
+    """Registered tools keyed by name."""
+    return {tool.name: tool for tool in registered_tools}
+
+
+@pytest.mark.xdist_group("tool_registry")
+class TestMCPToolRegistry:
+    """Checks on the tools the MCP server registers; these need no event loop."""
+
+    @pytest.mark.parametrize("tool_name", EXPECTED_TOOLS)
+    def test_server_tools_registration(self, tool_dict, tool_name):
+        """Test that each expected tool is registered with the MCP server."""
+        assert tool_name in tool_dict, f"Tool {tool_name} not registered with the MCP server"
+
+    def test_no_unexpected_tools(self, tool_dict):
+        """Test that the server registers no tools beyond the expected set."""
+        unexpected = tool_dict.keys() - frozenset(EXPECTED_TOOLS)
+        assert not unexpected, f"Unexpected tools registered: {sorted(unexpected)}"
+
+    @pytest.mark.parametrize("tool_name", EXPECTED_TOOLS)
+    def test_tool_descriptions_present(self, tool_dict, tool_name):
+        """Test that each tool has a description."""
+        description = tool_dict[tool_name].description
+        assert description is not None, f"Tool {tool_name} missing description"
+        assert len(description.strip()) > 10, f"Tool {tool_name} has too short description"
+
+    @pytest.mark.parametrize(
+        "tool_name,expected_field",
+        [
+            ("query_database", "sql"),
+            ("chat_with_ollama", "prompt"),
+            ("analyze_data_with_llm", "table_name"),
+            ("generate_sql_with_llamaindex", "description"),
+        ],
+    )
+    def test_tool_input_schemas(self, tool_dict, tool_name, expected_field):
+        """Test that tools have proper input schemas."""
+        assert expected_field in tool_dict[tool_name].inputSchema["properties"]
 
 
+@pytest.mark.xdist_group("integration")
 class TestMCPServerIntegration:
     """Integration tests for the complete MCP server."""
 
-    @pytest.mark.asyncio
-    async def test_server_initialization(self, temp_db):
+    # Share one event loop across the class, matching the session-scoped
+    # async fixtures, even if the configured default loop scope changes
+    pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+    async def test_server_initialization(self, temp_db, server_mod):
         """Test that the server initializes correctly."""
         # Mock the database path and test the components directly
-        with patch("mcp_simple_db_access.server.DB_PATH", temp_db):
+        with patch.object(server_mod, "DB_PATH", temp_db):
             # Test that the database manager can be created
-            from mcp_simple_db_access.server import DatabaseManager
-            db_manager = DatabaseManager(temp_db)
-            await db_manager.init_db()
-
-            # Verify tables were created
-            tables = await db_manager.execute_query("SELECT name FROM sqlite_master WHERE type='table'")
-            table_names = [table["name"] for table in tables]
-            assert "users" in table_names
-            assert "products" in table_names
-            assert "orders" in table_names
-
-    @pytest.mark.asyncio
-    async def test_server_tools_registration(self):
-        """Test that all expected tools are registered."""
-        # Test that the tools are available in the server module by checking if they are defined
-        from mcp_simple_db_access import server
-
-        expected_tools = [
-            "query_database",
-            "insert_sample_data",
-            "analyze_data_with_llm",
-            "chat_with_ollama",
-            "list_ollama_models",
-            "get_database_schema",
-            "create_table",
-            "chat_with_context",
-            "analyze_database_with_llamaindex",
-            "generate_sql_with_llamaindex",
-        ]
-
-        # Check that all expected tools are functions in the server module
-        for tool_name in expected_tools:
-            assert hasattr(
-                server, tool_name), f"Tool {tool_name} not found in server module"
-            assert callable(getattr(server, tool_name)
-                            ), f"Tool {tool_name} is not callable"
-
-    @pytest.mark.asyncio
-    async def test_tool_descriptions_present(self):
-        """Test that all tools have descriptions."""
-        # Test that the tool functions have docstrings
-        from mcp_simple_db_access import server
-
-        tool_functions = [
-            server.query_database,
-            server.insert_sample_data,
-            server.analyze_data_with_llm,
-            server.chat_with_ollama,
-            server.list_ollama_models,
-            server.get_database_schema,
-            server.create_table,
-            server.chat_with_context,
-            server.analyze_database_with_llamaindex,
-            server.generate_sql_with_llamaindex,
-        ]
-
-        for func in tool_functions:
-            assert func.__doc__ is not None, f"Function {func.__name__} missing docstring"
-            assert len(func.__doc__.strip(
-            )) > 10, f"Function {func.__name__} has too short docstring"
-
-    @pytest.mark.asyncio
-    async def test_tool_input_schemas(self):
-        """Test that tools have proper input schemas."""
-        # Test that the tool functions have proper type annotations
-        from mcp_simple_db_access import server
-        import inspect
+            async with server_mod.DatabaseManager(temp_db) as db_manager:
+                await db_manager.init_db()
 
-        # Test some specific functions have the right parameters
-        query_sig = inspect.signature(server.query_database)
-        assert 'sql' in query_sig.parameters
+                # Verify tables were created
+                tables = await db_manager.execute_query("SELECT name FROM sqlite_master WHERE type='table'")
+                table_names = [table["name"] for table in tables]
+                assert "users" in table_names
+                assert "products" in table_names
+                assert "orders" in table_names
 
-        chat_sig = inspect.signature(server.chat_with_ollama)
-        assert 'prompt' in chat_sig.parameters
-
-        analyze_sig = inspect.signature(server.analyze_data_with_llm)
-        assert 'table_name' in analyze_sig.parameters
-
-        generate_sig = inspect.signature(server.generate_sql_with_llamaindex)
-        assert 'description' in generate_sig.parameters
-
-    @pytest.mark.asyncio
-    async def test_database_workflow(self, temp_db, mock_ollama_client):
+    async def test_database_workflow(self, temp_db, db_manager, mock_ollama_client, server_mod):
         """Test a complete database workflow."""
         with (
-            patch("mcp_simple_db_access.server.DB_PATH", temp_db),
-            patch("mcp_simple_db_access.server.ollama_client", mock_ollama_client),
+            patch.object(server_mod, "DB_PATH", temp_db),
+            patch.object(server_mod, "ollama_client", mock_ollama_client),
+            patch.object(server_mod, "db_manager", db_manager),
         ):
-            from mcp_simple_db_access import server
-
-            # Create a database manager for testing
-            db_manager = server.DatabaseManager(temp_db)
-            await db_manager.init_db()
-
-            # Test the workflow by calling the server functions directly
-            with patch.object(server, "db_manager", db_manager):
-                # 1. Insert sample data
-                result = await server.insert_sample_data()
-                assert "successfully" in result
-
-                # 2. Query the data
-                result = await server.query_database("SELECT * FROM users")
-                users = json.loads(result)
-                assert len(users) == 2
-
-                # 3. Get schema
-                result = await server.get_database_schema()
-                schema = json.loads(result)
-                assert "users" in schema
-                assert "products" in schema
-
-    @pytest.mark.asyncio
-    async def test_llm_integration_workflow(self, temp_db, mock_ollama_client):
-        """Test LLM integration workflow."""
-        mock_ollama_client.generate.return_value = "Mock LLM response"
-        mock_ollama_client.list_models.return_value = ["llama3.2", "gemma2"]
+            # 1. Insert sample data
+            result = await server_mod.insert_sample_data()
+            assert "successfully" in result
 
-        with (
-            patch("mcp_simple_db_access.server.DB_PATH", temp_db),
-            patch("mcp_simple_db_access.server.ollama_client", mock_ollama_client),
-        ):
-            from mcp_simple_db_access import server
-
-            # Create a database manager for testing
-            db_manager = server.DatabaseManager(temp_db)
-            await db_manager.init_db()
-
-            with patch.object(server, "db_manager", db_manager):
-                # 1. Insert sample data first
-                await server.insert_sample_data()
+            # 2. Query the data
+            result = await server_mod.query_database("SELECT * FROM users")
+            users = json.loads(result)
+            assert len(users) == 2
 
-                # 2. List models
-                result = await server.list_ollama_models()
-                assert "llama3.2" in result
+            # 3. Get schema
+            result = await server_mod.get_database_schema()
+            schema = json.loads(result)
+            assert {"users", "products"} <= schema.keys()
 
-                # 3. Chat with Ollama
-                result = await server.chat_with_ollama("Hello", "llama3.2")
-                assert result == "Mock LLM response"
-
-                # 4. Analyze data with LLM
-                result = await server.analyze_data_with_llm("users", "What patterns do you see?", "llama3.2")
-                assert result == "Mock LLM response"
-
-    @pytest.mark.asyncio
-    async def test_llamaindex_workflow(self, temp_db, mock_ollama_client):
+    async def test_llm_integration_workflow(self, seeded_db, seeded_db_manager, mock_ollama_client, server_mod):
+        """Test LLM integration workflow."""
+        with (
+            patch.object(server_mod, "DB_PATH", seeded_db),
+            patch.object(server_mod, "ollama_client", mock_ollama_client),
+            patch.object(server_mod, "db_manager", seeded_db_manager),
+        ):
+            # 2-4. List models, chat and analyze data; none depends on another
+            models, chat, analysis = await asyncio.gather(
+                server_mod.list_ollama_models(),
+                server_mod.chat_with_ollama("Hello", "llama3.2"),
+                server_mod.analyze_data_with_llm("users", "What patterns do you see?", "llama3.2"),
+            )
+            assert "llama3.2" in models
+            assert chat == "Mock LLM response"
+            assert analysis == "Mock LLM response"
+
+    async def test_llamaindex_workflow(self, seeded_db, seeded_db_manager, mock_ollama_client, server_mod):
         """Test LlamaIndex-specific features."""
         mock_ollama_client.generate.return_value = "LlamaIndex analysis result"
 
         with (
-            patch("mcp_simple_db_access.server.DB_PATH", temp_db),
-            patch("mcp_simple_db_access.server.ollama_client", mock_ollama_client),
+            patch.object(server_mod, "DB_PATH", seeded_db),
+            patch.object(server_mod, "ollama_client", mock_ollama_client),
+            patch.object(server_mod, "db_manager", seeded_db_manager),
         ):
-            from mcp_simple_db_access import server
-
-            # Create a database manager for testing
-            db_manager = server.DatabaseManager(temp_db)
-            await db_manager.init_db()
-
-            with patch.object(server, "db_manager", db_manager):
-                # 1. Insert sample data
-                await server.insert_sample_data()
-
-                # 2. Chat with context
-                result = await server.chat_with_context(
+            # 2-3. Chat with context and comprehensive database analysis, run concurrently
+            chat, analysis = await asyncio.gather(
+                server_mod.chat_with_context(
                     "What can you tell me about this database?",
                     "This is a test database with sample data",
                     "llama3.2"
-                )
-                assert result == "LlamaIndex analysis result"
-
-                # 3. Comprehensive database analysis
-                result = await server.analyze_database_with_llamaindex("Provide insights about the database", "llama3.2")
-                assert result == "LlamaIndex analysis result"
-
-                # 4. SQL generation
-                mock_ollama_client.generate.return_value = "SELECT * FROM users WHERE age > 25"
-                result = await server.generate_sql_with_llamaindex("Find users older than 25", "llama3.2")
-                assert "SELECT * FROM users WHERE age > 25" in result
-
-    @pytest.mark.asyncio
-    async def test_error_handling_workflow(self, temp_db, mock_ollama_client):
+                ),
+                server_mod.analyze_database_with_llamaindex("Provide insights about the database", "llama3.2"),
+            )
+            assert chat == "LlamaIndex analysis result"
+            assert analysis == "LlamaIndex analysis result"
+
+            # 4. SQL generation
+            mock_ollama_client.generate.return_value = "SELECT * FROM users WHERE age > 25"
+            result = await server_mod.generate_sql_with_llamaindex("Find users older than 25", "llama3.2")
+            assert "SELECT * FROM users WHERE age > 25" in result
+
+    async def test_error_handling_workflow(self, temp_db, db_manager, mock_ollama_client, server_mod):
         """Test error handling across different scenarios."""
         with (
-            patch("mcp_simple_db_access.server.DB_PATH", temp_db),
-            patch("mcp_simple_db_access.server.ollama_client", mock_ollama_client),
+            patch.object(server_mod, "DB_PATH", temp_db),
+            patch.object(server_mod, "ollama_client", mock_ollama_client),
+            patch.object(server_mod, "db_manager", db_manager),
         ):
-            from mcp_simple_db_access import server
-
-            # Create a database manager for testing
-            db_manager = server.DatabaseManager(temp_db)
-            await db_manager.init_db()
-
-            with patch.object(server, "db_manager", db_manager):
-                # 1. Invalid SQL query
-                # Not allowed
-                result = await server.query_database("DELETE FROM users")
-                assert "Only SELECT queries are allowed" in result
-
-                # 2. Query non-existent table
-                result = await server.query_database("SELECT * FROM nonexistent_table")
-                assert "Database error" in result
-
-                # 3. LLM error
-                mock_ollama_client.generate.side_effect = Exception(
-                    "LLM error")
-                result = await server.chat_with_ollama("Hello", "llama3.2")
-                assert "Error communicating with Ollama" in result
-
-    @pytest.mark.asyncio
-    async def test_security_features(self, temp_db):
+            # 1. Invalid SQL query
+            # Not allowed
+            result = await server_mod.query_database("DELETE FROM users")
+            assert "Only SELECT queries are allowed" in result
+
+            # 2. Query non-existent table
+            result = await server_mod.query_database("SELECT * FROM nonexistent_table")
+            assert "Database error" in result
+
+            # 3. LLM error
+            mock_ollama_client.generate.side_effect = Exception(
+                "LLM error")
+            result = await server_mod.chat_with_ollama("Hello", "llama3.2")
+            assert "Error communicating with Ollama" in result
+
+    @pytest.mark.parametrize("query", MALICIOUS_QUERIES)
+    async def test_malicious_query_rejected(self, seeded_db_manager, server_mod, query):
+        """Test that write and stacked statements are refused and change nothing."""
+        with patch.object(server_mod, "db_manager", seeded_db_manager):
+            result = await server_mod.query_database(query)
+            assert result.startswith(ERROR_PREFIXES), f"{query!r} was not rejected: {result}"
+
+            result = await server_mod.query_database("SELECT COUNT(*) as count FROM users")
+            assert json.loads(result)[0]["count"] == 2
+
+    async def test_security_features(self, seeded_db, seeded_db_manager, server_mod):
         """Test security features of the server."""
-        with patch("mcp_simple_db_access.server.DB_PATH", temp_db):
-            from mcp_simple_db_access import server
-
-            # Create a database manager for testing
-            db_manager = server.DatabaseManager(temp_db)
-            await db_manager.init_db()
-
-            with patch.object(server, "db_manager", db_manager):
-                # 1. Insert sample data first
-                await server.insert_sample_data()
-
-                # 2. Test SQL injection prevention
-                malicious_queries = [
-                    "DELETE FROM users",  # This should be blocked
-                    "DROP TABLE users",   # This should be blocked
-                    "UPDATE users SET age = 100",  # This should be blocked
-                ]
-
-                for query in malicious_queries:
-                    # These should be blocked
-                    result = await server.query_database(query)
-                    assert "Only SELECT queries are allowed" in result
-
-                # Test potentially dangerous but valid SELECT queries
-                union_query = "SELECT * FROM users UNION SELECT * FROM sqlite_master"
-                result = await server.query_database(union_query)
-                # This currently works but shows system tables, which is not ideal
-                # but it's a valid SELECT query, so the current implementation allows it
-                # Should return some result, not an error
-                assert isinstance(result, str)
-
-                # 3. Verify users table still exists
-                result = await server.query_database("SELECT COUNT(*) as count FROM users")
-                count_data = json.loads(result)
-                # Sample data should still be there
-                assert count_data[0]["count"] == 2
-
-    @pytest.mark.asyncio
-    async def test_performance_basic(self, temp_db, mock_ollama_client):
-        """Basic performance test - ensure operations complete in reasonable time."""
-        mock_ollama_client.generate.return_value = "Quick response"
-
         with (
-            patch("mcp_simple_db_access.server.DB_PATH", temp_db),
-            patch("mcp_simple_db_access.server.ollama_client", mock_ollama_client),
+            patch.object(server_mod, "DB_PATH", seeded_db),
+            patch.object(server_mod, "db_manager", seeded_db_manager),
         ):
-
-            # Time database operations
-            import time
-
-            start_time = time.time()
-            await mcp.call_tool("insert_sample_data", {})
-            insert_time = time.time() - start_time
-
-            start_time = time.time()
-            await mcp.call_tool("query_database", {"sql": "SELECT * FROM users"})
-            query_time = time.time() - start_time
-
-            start_time = time.time()
-            await mcp.call_tool("get_database_schema", {})
-            schema_time = time.time() - start_time
-
-            # Operations should complete within reasonable time (adjust as needed)
-            assert insert_time < 5.0, f"Insert took too long: {insert_time}s"
-            assert query_time < 1.0, f"Query took too long: {query_time}s"
-            assert schema_time < 2.0, f"Schema took too long: {schema_time}s"
+            # Test potentially dangerous but valid SELECT queries
+            union_query = "SELECT * FROM users UNION SELECT * FROM sqlite_master"
+            result = await server_mod.query_database(union_query)
+            # This currently works but shows system tables, which is not ideal
+            # but it's a valid SELECT query, so the current implementation allows it
+            # Should return some result, not an error
+            assert isinstance(result, str)
+
+            # Verify users table still exists
+            result = await server_mod.query_database("SELECT COUNT(*) as count FROM users")
+            count_data = json.loads(result)
+            # Sample data should still be there
+            assert count_data[0]["count"] == 2
+
+
+@pytest.fixture
+def benchmark_server(temp_db, mock_ollama_client, server_mod):
+    """Event loop plus a server wired to the test database, for synchronous benchmarks."""
+    loop = asyncio.new_event_loop()
+    manager = server_mod.DatabaseManager(temp_db)
+    loop.run_until_complete(manager.connect())
+
+    with (
+        patch.object(server_mod, "db_manager", manager),
+        patch.object(server_mod, "ollama_client", mock_ollama_client),
+    ):
+        yield loop, manager, server_mod.mcp
+
+    loop.run_until_complete(manager.close())
+    loop.close()
+
+
+@pytest.mark.benchmark(group="mcp_tools")
+class TestMCPServerBenchmarks:
+    """Benchmarks for tool calls; run with ``pytest -m benchmark``."""
+
+    def test_insert_sample_data_benchmark(self, benchmark, benchmark_server):
+        """Benchmark inserting the sample data."""
+        loop, _, mcp = benchmark_server
+
+        benchmark.pedantic(
+            lambda: loop.run_until_complete(mcp.call_tool("insert_sample_data", {})), rounds=3, warmup_rounds=1
+        )
+
+    def test_query_database_benchmark(self, benchmark, benchmark_server):
+        """Benchmark a SELECT over the seeded users table."""
+        loop, _, mcp = benchmark_server
+        loop.run_until_complete(mcp.call_tool("insert_sample_data", {}))
+
+        result = benchmark.pedantic(
+            lambda: loop.run_until_complete(mcp.call_tool("query_database", {"sql": "SELECT * FROM users"})),
+            rounds=3,
+            warmup_rounds=1,
+        )
+        assert result
+
+    def test_get_database_schema_benchmark(self, benchmark, benchmark_server):
+        """Benchmark rebuilding the schema snapshot (the cache is dropped before each round)."""
+        loop, manager, mcp = benchmark_server
+        loop.run_until_complete(mcp.call_tool("insert_sample_data", {}))
+
+        benchmark.pedantic(
+            lambda: loop.run_until_complete(mcp.call_tool("get_database_schema", {})),
+            setup=manager.invalidate_schema,
+            rounds=3,
+            warmup_rounds=1,
+        )
@@ -2,11 +2,25 @@
 Tests for OllamaLlamaIndexClient class.
 """
 
+import asyncio
+
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
 import httpx
 
-from mcp_simple_db_access.server import OllamaLlamaIndexClient, get_ollama_llm
+from mcp_simple_db_access.server import OllamaLlamaIndexClient, _messages_to_prompt, get_ollama_llm
+
+
+TAGS_REQUEST = httpx.Request("GET", "http://localhost:11434/api/tags")
+
+
+@pytest.fixture
+def mock_http_client(monkeypatch):
+    """Mock standing in for the httpx.AsyncClient the Ollama client creates."""
+    http = AsyncMock(spec=httpx.AsyncClient)
+    monkeypatch.setattr(httpx, "AsyncClient", Mock(return_value=http))
+    return http
 
 
 class TestOllamaLlamaIndexClient:
@@ -17,7 +31,6 @@ class TestOllamaLlamaIndexClient:
         client = OllamaLlamaIndexClient("http://test:11434")
         assert client.base_url == "http://test:11434"
 
-    @pytest.mark.asyncio
     async def test_generate_success(self, mock_llama_index):
         """Test successful text generation."""
         # Setup mock
@@ -31,14 +44,13 @@ class TestOllamaLlamaIndexClient:
             assert result == "Generated response"
             mock_llama_index.acomplete.assert_called_once_with("Test prompt")
 
-    @pytest.mark.asyncio
     async def test_generate_error_handling(self):
         """Test error handling in generate method."""
         client = OllamaLlamaIndexClient()
 
         with patch("mcp_simple_db_access.server.get_ollama_llm") as mock_get_llm:
             # Mock LLM to raise an exception
-            mock_llm = MagicMock()
+            mock_llm = Mock(spec=["acomplete"])
             mock_llm.acomplete = AsyncMock(
                 side_effect=Exception("Connection error"))
             mock_get_llm.return_value = mock_llm
@@ -48,68 +60,149 @@ class TestOllamaLlamaIndexClient:
             assert "Error communicating with Ollama via LlamaIndex" in result
             assert "Connection error" in result
 
-    @pytest.mark.asyncio
-    async def test_list_models_success(self):
-        """Test successful model listing."""
+    async def test_generate_caches_identical_prompts(self, mock_llama_index):
+        """Test that identical prompts are answered from the response cache."""
+        mock_llama_index.acomplete.return_value = "Cached response"
+
         client = OllamaLlamaIndexClient()
 
-        # Mock successful HTTP response
-        mock_response = MagicMock()
-        mock_response.raise_for_status.return_value = None
-        mock_response.json.return_value = {"models": [
-            {"name": "llama3.2"}, {"name": "gemma2"}, {"name": "codellama"}]}
+        with patch("mcp_simple_db_access.server.get_ollama_llm", return_value=mock_llama_index):
+            assert await client.generate("llama3.2", "Same prompt") == "Cached response"
+            assert await client.generate("llama3.2", "Same prompt") == "Cached response"
+            assert mock_llama_index.acomplete.call_count == 1
+
+            # A different model, a sampling temperature or invalidation all skip the cache
+            await client.generate("gemma2", "Same prompt")
+            await client.generate("llama3.2", "Same prompt", temperature=0.8)
+            client.invalidate()
+            await client.generate("llama3.2", "Same prompt")
+            assert mock_llama_index.acomplete.call_count == 4
+
+    async def test_generate_does_not_cache_errors(self):
+        """Test that failed generations are retried instead of cached."""
+        client = OllamaLlamaIndexClient()
+
+        with patch("mcp_simple_db_access.server.get_ollama_llm") as mock_get_llm:
+            mock_llm = Mock(spec=["acomplete"])
+            mock_llm.acomplete = AsyncMock(side_effect=[Exception("Connection error"), "Recovered"])
+            mock_get_llm.return_value = mock_llm
+
+            assert "Connection error" in await client.generate("llama3.2", "Test prompt")
+            assert await client.generate("llama3.2", "Test prompt") == "Recovered"
 
-        with patch("httpx.AsyncClient") as mock_client_class:
-            mock_client = AsyncMock()
-            mock_client.__aenter__.return_value = mock_client
-            mock_client.__aexit__.return_value = None
-            mock_client.get.return_value = mock_response
-            mock_client_class.return_value = mock_client
+    async def test_generate_coalesces_concurrent_prompts(self):
+        """Test that concurrent identical prompts share one Ollama call."""
+        release = asyncio.Event()
 
-            models = await client.list_models()
+        async def slow_complete(prompt):
+            await release.wait()
+            return f"Answer to {prompt}"
 
-            assert models == ["llama3.2", "gemma2", "codellama"]
-            mock_client.get.assert_called_once_with(
-                "http://localhost:11434/api/tags")
+        mock_llm = Mock(spec=["acomplete"])
+        mock_llm.acomplete = AsyncMock(side_effect=slow_complete)
+        client = OllamaLlamaIndexClient()
 
-    @pytest.mark.asyncio
-    async def test_list_models_empty_response(self):
-        """Test listing models with empty response."""
+        with patch("mcp_simple_db_access.server.get_ollama_llm", return_value=mock_llm):
+            tasks = [asyncio.create_task(client.generate("llama3.2", "Same prompt")) for _ in range(5)]
+            other = asyncio.create_task(client.generate("llama3.2", "Other prompt"))
+            await asyncio.sleep(0)
+            release.set()
+            results = await asyncio.gather(*tasks)
+
+            assert results == ["Answer to Same prompt"] * 5
+            assert await other == "Answer to Other prompt"
+            assert mock_llm.acomplete.call_count == 2
+            assert client._inflight == {}
+
+    async def test_generate_bounds_concurrency(self):
+        """Test that at most max_concurrency completions run at once."""
+        running = 0
+        peak = 0
+
+        async def tracked_complete(prompt):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return prompt
+
+        mock_llm = Mock(spec=["acomplete"])
+        mock_llm.acomplete = AsyncMock(side_effect=tracked_complete)
+        client = OllamaLlamaIndexClient(max_concurrency=2)
+
+        with patch("mcp_simple_db_access.server.get_ollama_llm", return_value=mock_llm):
+            results = await asyncio.gather(*(client.generate("llama3.2", f"Prompt {i}") for i in range(6)))
+
+        assert results == [f"Prompt {i}" for i in range(6)]
+        assert peak == 2
+
+    async def test_generate_stream_yields_chunks(self):
+        """Test that streamed chunks are yielded in order and then cached."""
+
+        async def chunks():
+            for delta in ("Hello", ", ", "world"):
+                yield SimpleNamespace(delta=delta)
+
+        mock_llm = Mock(spec=["acomplete", "astream_complete"])
+        mock_llm.astream_complete = AsyncMock(return_value=chunks())
         client = OllamaLlamaIndexClient()
 
-        mock_response = MagicMock()
-        mock_response.raise_for_status.return_value = None
-        mock_response.json.return_value = {"models": []}
+        with patch("mcp_simple_db_access.server.get_ollama_llm", return_value=mock_llm):
+            streamed = [delta async for delta in client.generate_stream("llama3.2", "Greet")]
+            assert streamed == ["Hello", ", ", "world"]
+
+            # The assembled text now answers both APIs from the cache
+            assert [delta async for delta in client.generate_stream("llama3.2", "Greet")] == ["Hello, world"]
+            assert await client.generate("llama3.2", "Greet") == "Hello, world"
+            assert mock_llm.astream_complete.call_count == 1
+            mock_llm.acomplete.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "response, expected",
+        [
+            (
+                {"models": [{"name": "llama3.2"}, {"name": "gemma2"}, {"name": "codellama"}]},
+                ["llama3.2", "gemma2", "codellama"],
+            ),
+            ({"models": []}, []),
+            (httpx.ConnectError("Connection failed"), []),
+        ],
+        ids=["success", "empty_response", "error_handling"],
+    )
+    async def test_list_models(self, mock_http_client, response, expected):
+        """Test model listing for a populated, an empty and a failed response."""
+        if isinstance(response, Exception):
+            mock_http_client.get.side_effect = response
+        else:
+            mock_http_client.get.return_value = httpx.Response(200, json=response, request=TAGS_REQUEST)
 
-        with patch("httpx.AsyncClient") as mock_client_class:
-            mock_client = AsyncMock()
-            mock_client.__aenter__.return_value = mock_client
-            mock_client.__aexit__.return_value = None
-            mock_client.get.return_value = mock_response
-            mock_client_class.return_value = mock_client
+        client = OllamaLlamaIndexClient()
+        models = await client.list_models()
 
-            models = await client.list_models()
+        assert models == expected
+        mock_http_client.get.assert_awaited_once_with(str(TAGS_REQUEST.url))
 
-            assert models == []
+    async def test_list_models_reuses_http_client(self):
+        """Test that repeated model listings share one HTTP client."""
+        requests = []
 
-    @pytest.mark.asyncio
-    async def test_list_models_error_handling(self):
-        """Test error handling in list_models method."""
-        client = OllamaLlamaIndexClient()
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={"models": [{"name": "llama3.2"}]})
 
-        with patch("httpx.AsyncClient") as mock_client_class:
-            mock_client = AsyncMock()
-            mock_client.__aenter__.return_value = mock_client
-            mock_client.__aexit__.return_value = None
-            mock_client.get.side_effect = httpx.ConnectError(
-                "Connection failed")
-            mock_client_class.return_value = mock_client
+        client = OllamaLlamaIndexClient("http://test:11434")
+        client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        http = client.http
 
-            models = await client.list_models()
+        assert await client.list_models() == ["llama3.2"]
+        assert await client.list_models() == ["llama3.2"]
+        assert client.http is http
+        assert len(requests) == 2
 
-            assert models == []
+        await client.aclose()
+        assert http.is_closed
 
-    @pytest.mark.asyncio
     async def test_chat_success(self, mock_llama_index):
         """Test successful chat functionality."""
         mock_llama_index.acomplete.return_value = "Chat response"
@@ -130,13 +223,12 @@ class TestOllamaLlamaIndexClient:
             expected_prompt = "user: Hello\nassistant: Hi there!\nuser: How are you?"
             mock_llama_index.acomplete.assert_called_once_with(expected_prompt)
 
-    @pytest.mark.asyncio
     async def test_chat_error_handling(self):
         """Test error handling in chat method."""
         client = OllamaLlamaIndexClient()
 
         with patch("mcp_simple_db_access.server.get_ollama_llm") as mock_get_llm:
-            mock_llm = MagicMock()
+            mock_llm = Mock(spec=["acomplete"])
             mock_llm.acomplete = AsyncMock(side_effect=Exception("Chat error"))
             mock_get_llm.return_value = mock_llm
 
@@ -150,10 +242,17 @@ class TestOllamaLlamaIndexClient:
 class TestOllamaLLMFunction:
     """Test cases for get_ollama_llm function."""
 
+    @pytest.fixture(autouse=True)
+    def clear_llm_cache(self):
+        """Start and end each test with an empty LLM instance cache."""
+        get_ollama_llm.cache_clear()
+        yield
+        get_ollama_llm.cache_clear()
+
     @patch("mcp_simple_db_access.server.Ollama")
     def test_get_ollama_llm_default_params(self, mock_ollama_class):
         """Test get_ollama_llm with default parameters."""
-        mock_instance = MagicMock()
+        mock_instance = object()
         mock_ollama_class.return_value = mock_instance
 
         result = get_ollama_llm()
@@ -162,12 +261,12 @@ class TestOllamaLLMFunction:
             # DEFAULT_MODEL from server
             model="llama3.2", base_url="http://localhost:11434", request_timeout=60.0
         )
-        assert result == mock_instance
+        assert result is mock_instance
 
     @patch("mcp_simple_db_access.server.Ollama")
     def test_get_ollama_llm_custom_params(self, mock_ollama_class):
         """Test get_ollama_llm with custom parameters."""
-        mock_instance = MagicMock()
+        mock_instance = object()
         mock_ollama_class.return_value = mock_instance
 
         result = get_ollama_llm("custom-model", "http://custom:8080")
@@ -175,4 +274,28 @@ class TestOllamaLLMFunction:
         mock_ollama_class.assert_called_once_with(
             model="custom-model", base_url="http://custom:8080", request_timeout=60.0
         )
-        assert result == mock_instance
+        assert result is mock_instance
+
+    @patch("mcp_simple_db_access.server.Ollama")
+    def test_get_ollama_llm_is_cached(self, mock_ollama_class):
+        """Test that repeated calls reuse the same LLM instance."""
+        first = get_ollama_llm("custom-model", "http://custom:8080")
+        second = get_ollama_llm("custom-model", "http://custom:8080")
+        get_ollama_llm("other-model", "http://custom:8080")
+
+        assert first is second
+        assert mock_ollama_class.call_count == 2
+
+
+@pytest.mark.benchmark(group="prompt")
+def test_messages_to_prompt_benchmark(benchmark):
+    """Benchmark flattening a short chat history; run with ``pytest -m benchmark``."""
+    messages = [
+        {"role": "user", "content": "Hello"},
+        {"role": "assistant", "content": "Hi there!"},
+        {"role": "user", "content": "How are you?"},
+    ]
+
+    prompt = benchmark(_messages_to_prompt, messages)
+
+    assert prompt == "user: Hello\nassistant: Hi there!\nuser: How are you?"
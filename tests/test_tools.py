@@ -2,267 +2,344 @@
 Tests for MCP server tools.
 """
 
+import asyncio
+import sqlite3
+from contextlib import closing
+
 import pytest
-import json
+import orjson
 from unittest.mock import AsyncMock, patch, MagicMock
 
 from mcp_simple_db_access import server
 
 
+@pytest.fixture(autouse=True)
+def serve_test_fixtures(request, monkeypatch):
+    """Point the server's db_manager and ollama_client at whichever test doubles a test requests."""
+    for fixture_name, attribute in (
+        ("db_manager", "db_manager"),
+        ("populated_db", "db_manager"),
+        ("mock_ollama_client", "ollama_client"),
+    ):
+        if fixture_name in request.fixturenames:
+            monkeypatch.setattr(server, attribute, request.getfixturevalue(fixture_name))
+
+
 class TestMCPTools:
     """Test cases for MCP server tools."""
 
-    @pytest.mark.asyncio
     async def test_query_database_success(self, populated_db):
         """Test successful database query."""
-        with patch.object(server, "db_manager", populated_db):
-            result = await server.query_database("SELECT * FROM users")
+        result = await server.query_database("SELECT * FROM users")
 
-            # Should return JSON string
-            data = json.loads(result)
-            assert len(data) == 2
-            assert data[0]["name"] == "Test User 1"
-            assert data[1]["name"] == "Test User 2"
+        # Should return JSON string
+        data = orjson.loads(result)
+        assert len(data) == 2
+        assert data[0]["name"] == "Test User 1"
+        assert data[1]["name"] == "Test User 2"
 
-    @pytest.mark.asyncio
-    async def test_query_database_non_select_blocked(self, populated_db):
+    async def test_query_database_non_select_blocked(self, db_manager):
         """Test that non-SELECT queries are blocked."""
-        with patch.object(server, "db_manager", populated_db):
-            result = await server.query_database("DELETE FROM users")
-
-            assert "Only SELECT queries are allowed" in result
-
-    @pytest.mark.asyncio
-    async def test_query_database_empty_result(self, populated_db):
-        """Test query with no results."""
-        with patch.object(server, "db_manager", populated_db):
-            result = await server.query_database("SELECT * FROM users WHERE age > 100")
-
-            assert "returned no results" in result
-
-    @pytest.mark.asyncio
-    async def test_query_database_error_handling(self, populated_db):
-        """Test error handling in database queries."""
-        with patch.object(server, "db_manager", populated_db):
-            result = await server.query_database("SELECT * FROM nonexistent_table")
-
-            assert "Database error" in result
-
-    @pytest.mark.asyncio
-    async def test_insert_sample_data(self, db_manager):
-        """Test inserting sample data."""
-        with patch.object(server, "db_manager", db_manager):
-            result = await server.insert_sample_data()
-
-            assert "Sample data inserted successfully" in result
+        result = await server.query_database("DELETE FROM users")
 
-            # Verify data was inserted
-            users = await db_manager.execute_query("SELECT * FROM users")
-            products = await db_manager.execute_query("SELECT * FROM products")
+        assert "Only SELECT queries are allowed" in result
 
-            assert len(users) == 2
-            assert len(products) == 2
-            assert users[0]["name"] == "John Doe"
-            assert products[0]["name"] == "Laptop"
+    async def test_query_database_multiple_statements_blocked(self, populated_db):
+        """Test that a SELECT followed by another statement is rejected."""
+        result = await server.query_database("SELECT * FROM users; DROP TABLE users")
+        assert "Only a single SQL statement is allowed" in result
 
-    @pytest.mark.asyncio
-    async def test_get_database_schema(self, populated_db):
-        """Test getting database schema."""
-        with patch.object(server, "db_manager", populated_db):
-            result = await server.get_database_schema()
+        # Semicolons inside literals, and a trailing semicolon, are fine
+        result = await server.query_database("select name FROM users WHERE name != 'a;b';")
+        assert len(orjson.loads(result)) == 2
 
-            schema = json.loads(result)
+    @pytest.mark.parametrize(
+        "sql",
+        ["SELECT 1 AS value; -- note", "SELECT 1 AS value;\n/* done */", "SELECT 1 AS value;\n-- a\n/* b */\n"],
+    )
+    async def test_query_database_allows_trailing_comments(self, db_manager, sql):
+        """Test that comments after the final semicolon aren't taken for a second statement."""
+        result = await server.query_database(sql)
 
-            # Should have all three tables
-            assert "users" in schema
-            assert "products" in schema
-            assert "orders" in schema
+        assert orjson.loads(result) == [{"value": 1}]
 
-            # Check users table structure
-            users_schema = schema["users"]
-            assert users_schema["row_count"] == 2
+    @pytest.mark.parametrize(
+        "sql", ["SELECT 1; -- note\nDROP TABLE users", "SELECT 1; /* ; */ DELETE FROM users", "SELECT 1;SELECT 2"]
+    )
+    async def test_query_database_rejects_statement_after_comment(self, db_manager, sql):
+        """Test that a statement hidden behind a trailing comment is still rejected."""
+        result = await server.query_database(sql)
 
-            # Check column information
-            columns = users_schema["columns"]
-            column_names = [col["name"] for col in columns]
-            assert "id" in column_names
-            assert "name" in column_names
-            assert "email" in column_names
-            assert "age" in column_names
+        assert "Only a single SQL statement is allowed" in result
 
-    @pytest.mark.asyncio
-    async def test_create_table_success(self, db_manager):
-        """Test successful table creation."""
-        with patch.object(server, "db_manager", db_manager):
-            result = await server.create_table(
-                "test_table", "CREATE TABLE test_table (id INTEGER PRIMARY KEY, name TEXT)"
-            )
-
-            assert "created successfully" in result
-
-            # Verify table was created
-            tables = await db_manager.execute_query(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='test_table'"
-            )
-            assert len(tables) == 1
-
-    @pytest.mark.asyncio
-    async def test_create_table_invalid_sql(self, db_manager):
-        """Test table creation with invalid SQL."""
-        with patch.object(server, "db_manager", db_manager):
-            result = await server.create_table("test_table", "DROP TABLE users")  # Not a CREATE TABLE statement
+    async def test_query_database_serializes_non_json_values(self, populated_db):
+        """Test that values JSON can't represent natively, like BLOBs, fall back to str()."""
+        result = await server.query_database("SELECT x'00ff' AS data, 'Zoë' AS name")
 
-            assert "Only CREATE TABLE statements are allowed" in result
+        assert orjson.loads(result) == [{"data": "b'\\x00\\xff'", "name": "Zoë"}]
 
-    @pytest.mark.asyncio
-    async def test_chat_with_ollama(self, mock_ollama_client):
-        """Test chat with Ollama."""
-        mock_ollama_client.generate.return_value = "Hello! I'm doing well."
-
-        with patch.object(server, "ollama_client", mock_ollama_client):
-            result = await server.chat_with_ollama("How are you?", "llama3.2")
-
-            assert result == "Hello! I'm doing well."
-            mock_ollama_client.generate.assert_called_once_with("llama3.2", "How are you?")
-
-    @pytest.mark.asyncio
-    async def test_chat_with_ollama_error(self, mock_ollama_client):
-        """Test chat with Ollama error handling."""
-        mock_ollama_client.generate.side_effect = Exception("Connection failed")
+    async def test_query_database_empty_result(self, db_manager):
+        """Test query with no results."""
+        result = await server.query_database("SELECT * FROM users WHERE age > 100")
 
-        with patch.object(server, "ollama_client", mock_ollama_client):
-            result = await server.chat_with_ollama("Hello", "llama3.2")
+        assert "returned no results" in result
 
-            assert "Error communicating with Ollama" in result
+    async def test_query_database_error_handling(self, db_manager):
+        """Test error handling in database queries."""
+        result = await server.query_database("SELECT * FROM nonexistent_table")
 
-    @pytest.mark.asyncio
-    async def test_list_ollama_models(self, mock_ollama_client):
-        """Test listing Ollama models."""
-        mock_ollama_client.list_models.return_value = ["llama3.2", "gemma2"]
+        assert "Database error" in result
 
-        with patch.object(server, "ollama_client", mock_ollama_client):
-            result = await server.list_ollama_models()
+    async def test_insert_sample_data(self, db_manager):
+        """Test inserting sample data."""
+        result = await server.insert_sample_data()
 
-            assert "Available Ollama models:" in result
-            assert "llama3.2" in result
-            assert "gemma2" in result
+        assert "Sample data inserted successfully" in result
 
-    @pytest.mark.asyncio
-    async def test_list_ollama_models_empty(self, mock_ollama_client):
-        """Test listing Ollama models when none available."""
-        mock_ollama_client.list_models.return_value = []
+        # Verify data was inserted
+        users, products = await asyncio.gather(
+            db_manager.execute_query("SELECT * FROM users"),
+            db_manager.execute_query("SELECT * FROM products"),
+        )
 
-        with patch.object(server, "ollama_client", mock_ollama_client):
-            result = await server.list_ollama_models()
+        assert len(users) == 2
+        assert len(products) == 2
+        assert users[0]["name"] == "John Doe"
+        assert products[0]["name"] == "Laptop"
 
-            assert "No models found" in result
+    def test_get_database_schema(self, populated_schema_json):
+        """Test getting database schema."""
+        schema = orjson.loads(populated_schema_json)
 
-    @pytest.mark.asyncio
-    async def test_analyze_data_with_llm(self, populated_db, mock_ollama_client):
-        """Test data analysis with LLM."""
-        mock_ollama_client.generate.return_value = "Analysis result"
+        # Should have all three tables
+        assert {"users", "products", "orders"} <= schema.keys()
 
-        with (
-            patch.object(server, "db_manager", populated_db),
-            patch.object(server, "ollama_client", mock_ollama_client),
-        ):
+        # Check users table structure
+        users_schema = schema["users"]
+        assert users_schema["row_count"] == 2
 
-            result = await server.analyze_data_with_llm("users", "What patterns do you see?")
+        # Check column information
+        columns = users_schema["columns"]
+        column_names = {col["name"] for col in columns}
+        assert {"id", "name", "email", "age"} <= column_names
 
-            assert result == "Analysis result"
+    async def test_get_database_schema_is_cached_until_write(self, populated_db):
+        """Test that the schema snapshot is reused until a write invalidates it."""
+        first = await server.get_database_schema()
 
-            # Verify the LLM was called with appropriate prompt
-            mock_ollama_client.generate.assert_called_once()
-            call_args = mock_ollama_client.generate.call_args
-            prompt = call_args[0][1]  # Second argument is the prompt
+        with patch.object(populated_db, "execute_query", wraps=populated_db.execute_query) as spy:
+            assert await server.get_database_schema() == first
+            spy.assert_not_called()
 
-            assert "users" in prompt
-            assert "What patterns do you see?" in prompt
+        await populated_db.execute_write(
+            "INSERT INTO users (name, email, age) VALUES (?, ?, ?)", ("Test User 3", "test3@example.com", 40)
+        )
+        schema = orjson.loads(await server.get_database_schema())
+        assert schema["users"]["row_count"] == 3
 
-    @pytest.mark.asyncio
-    async def test_chat_with_context(self, mock_ollama_client):
-        """Test chat with context."""
-        mock_ollama_client.generate.return_value = "Contextual response"
+    async def test_get_database_schema_many_tables(self, db_manager):
+        """Test that row counts work past SQLite's limit on UNION ALL terms."""
+        with closing(sqlite3.connect(db_manager.db_path)) as conn:
+            conn.executescript("".join(f"CREATE TABLE t{i} (id INTEGER);" for i in range(600)))
+            conn.execute("INSERT INTO t599 (id) VALUES (1)")
+            conn.commit()
 
-        with patch.object(server, "ollama_client", mock_ollama_client):
-            result = await server.chat_with_context(
-                "What can you tell me?", "Database contains user information", "llama3.2"
-            )
+        schema = orjson.loads(await server.get_database_schema())
 
-            assert result == "Contextual response"
+        assert len(schema) == 603
+        assert schema["t0"]["row_count"] == 0
+        assert schema["t599"]["row_count"] == 1
 
-            # Verify the prompt includes context
-            call_args = mock_ollama_client.generate.call_args
-            prompt = call_args[0][1]
+    def test_get_database_schema_skips_internal_tables(self, populated_schema_json):
+        """Test that SQLite's own bookkeeping tables are left out of the schema."""
+        schema = orjson.loads(populated_schema_json)
 
-            assert "Context: Database contains user information" in prompt
-            assert "User: What can you tell me?" in prompt
+        assert sorted(schema) == ["orders", "products", "users"]
+        assert schema["products"]["row_count"] == 2
+        assert schema["orders"]["row_count"] == 1
 
-    @pytest.mark.asyncio
-    async def test_chat_with_context_no_context(self, mock_ollama_client):
-        """Test chat with context when no context provided."""
-        mock_ollama_client.generate.return_value = "Simple response"
+    async def test_create_table_success(self, db_manager):
+        """Test successful table creation."""
+        result = await server.create_table("test_table", "CREATE TABLE test_table (id INTEGER PRIMARY KEY, name TEXT)")
 
-        with patch.object(server, "ollama_client", mock_ollama_client):
-            result = await server.chat_with_context("Hello", "", "llama3.2")
+        assert "created successfully" in result
 
-            assert result == "Simple response"
+        # Verify table was created
+        tables = await db_manager.execute_query(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='test_table'"
+        )
+        assert len(tables) == 1
 
-            # Verify the prompt is just the message
-            call_args = mock_ollama_client.generate.call_args
-            prompt = call_args[0][1]
+    async def test_create_table_invalid_sql(self, db_manager):
+        """Test table creation with invalid SQL."""
+        result = await server.create_table("test_table", "DROP TABLE users")  # Not a CREATE TABLE statement
+
+        assert "Only CREATE TABLE statements are allowed" in result
+
+    @pytest.mark.parametrize(
+        "response, expected",
+        [
+            ("Hello! I'm doing well.", "Hello! I'm doing well."),
+            (Exception("Connection failed"), "Error communicating with Ollama"),
+        ],
+        ids=["success", "error"],
+    )
+    async def test_chat_with_ollama(self, mock_ollama_client, response, expected):
+        """Test chat with Ollama, including error handling."""
+        if isinstance(response, Exception):
+            mock_ollama_client.generate.side_effect = response
+        else:
+            mock_ollama_client.generate.return_value = response
+
+        result = await server.chat_with_ollama("How are you?", "llama3.2")
+
+        assert expected in result
+        assert mock_ollama_client.generate.call_count == 1
+        assert mock_ollama_client.generate.call_args.args == ("llama3.2", "How are you?")
+
+    @pytest.mark.parametrize(
+        "models, expected_lines",
+        [
+            (["llama3.2", "gemma2"], ["Available Ollama models:", "- llama3.2", "- gemma2"]),
+            ([], ["No models found"]),
+        ],
+        ids=["models", "empty"],
+    )
+    async def test_list_ollama_models(self, mock_ollama_client, models, expected_lines):
+        """Test listing Ollama models, including when none are available."""
+        mock_ollama_client.list_models.return_value = models
+
+        result = await server.list_ollama_models()
+
+        for line in expected_lines:
+            assert line in result
 
-            assert prompt == "Hello"
+    async def test_analyze_data_with_llm(self, populated_db, mock_ollama_client):
+        """Test data analysis with LLM."""
+        result = await server.analyze_data_with_llm("users", "What patterns do you see?")
+
+        assert result == "Mock LLM response"
+
+        # Verify the LLM was called with appropriate prompt
+        assert mock_ollama_client.generate.call_count == 1
+        _, prompt = mock_ollama_client.generate.call_args.args
+
+        assert "users" in prompt
+        assert "What patterns do you see?" in prompt
+
+    @pytest.mark.parametrize(
+        "context, expected_prompt",
+        [
+            (
+                "Database contains user information",
+                "Context: Database contains user information\n\nUser: What can you tell me?\n\nAssistant:",
+            ),
+            ("", "What can you tell me?"),
+        ],
+        ids=["with_context", "no_context"],
+    )
+    async def test_chat_with_context(self, mock_ollama_client, context, expected_prompt):
+        """Test chat with context; without context the prompt is just the message."""
+        result = await server.chat_with_context("What can you tell me?", context, "llama3.2")
+
+        assert result == "Mock LLM response"
+        assert mock_ollama_client.generate.call_count == 1
+        assert mock_ollama_client.generate.call_args.args == ("llama3.2", expected_prompt)
 
-    @pytest.mark.asyncio
     async def test_analyze_database_with_llamaindex(self, populated_db, mock_ollama_client):
         """Test comprehensive database analysis."""
-        mock_ollama_client.generate.return_value = "Comprehensive analysis"
+        result = await server.analyze_database_with_llamaindex("What insights can you provide?")
 
-        with (
-            patch.object(server, "db_manager", populated_db),
-            patch.object(server, "ollama_client", mock_ollama_client),
-        ):
+        assert result == "Mock LLM response"
 
-            result = await server.analyze_database_with_llamaindex("What insights can you provide?")
+        # Verify the prompt includes schema and sample data
+        _, prompt = mock_ollama_client.generate.call_args.args
 
-            assert result == "Comprehensive analysis"
+        assert "Database Schema:" in prompt
+        assert "Sample Data:" in prompt
+        assert "What insights can you provide?" in prompt
 
-            # Verify the prompt includes schema and sample data
-            call_args = mock_ollama_client.generate.call_args
-            prompt = call_args[0][1]
-
-            assert "Database Schema:" in prompt
-            assert "Sample Data:" in prompt
-            assert "What insights can you provide?" in prompt
-
-    @pytest.mark.asyncio
     async def test_generate_sql_with_llamaindex(self, populated_db, mock_ollama_client):
         """Test SQL generation with LlamaIndex."""
         mock_ollama_client.generate.return_value = "SELECT * FROM users WHERE age > 25"
 
-        with (
-            patch.object(server, "db_manager", populated_db),
-            patch.object(server, "ollama_client", mock_ollama_client),
-        ):
-
-            result = await server.generate_sql_with_llamaindex("Find users older than 25")
+        result = await server.generate_sql_with_llamaindex("Find users older than 25")
 
-            assert "Generated SQL Query:" in result
-            assert "SELECT * FROM users WHERE age > 25" in result
-            assert "use the query_database tool" in result
+        assert "Generated SQL Query:" in result
+        assert "SELECT * FROM users WHERE age > 25" in result
+        assert "use the query_database tool" in result
 
-    @pytest.mark.asyncio
     async def test_generate_sql_with_llamaindex_code_blocks(self, populated_db, mock_ollama_client):
         """Test SQL generation with code block formatting."""
         mock_ollama_client.generate.return_value = "```sql\nSELECT * FROM users\n```"
 
-        with (
-            patch.object(server, "db_manager", populated_db),
-            patch.object(server, "ollama_client", mock_ollama_client),
-        ):
-
-            result = await server.generate_sql_with_llamaindex("Show all users")
-
-            # Should strip code block markers
-            assert "Generated SQL Query:\nSELECT * FROM users" in result
+        result = await server.generate_sql_with_llamaindex("Show all users")
+
+        # Should strip code block markers
+        assert "Generated SQL Query:\nSELECT * FROM users" in result
+
+    async def test_analysis_prompts_share_prefix(self, populated_db, mock_ollama_client):
+        """Test that prompts keep the data first and the question last."""
+        await server.analyze_database_with_llamaindex("First question?")
+        await server.analyze_database_with_llamaindex("Second question?")
+
+        first, second = (call.args[1] for call in mock_ollama_client.generate.call_args_list)
+        assert first.rstrip().endswith("Question: First question?")
+        assert second.rstrip().endswith("Question: Second question?")
+        assert first.split("Question: First")[0] == second.split("Question: Second")[0]
+
+    async def test_chat_with_ollama_streams_progress(self):
+        """Test that a request with a progress token gets the response as progress notifications."""
+
+        async def stream(model, prompt):
+            for delta in ("Partial", " answer"):
+                yield delta
+
+        client = MagicMock()
+        client.generate_stream = stream
+        client.generate = AsyncMock()
+        ctx = MagicMock()
+        ctx.request_context.meta.progressToken = "token-1"
+        ctx.report_progress = AsyncMock()
+
+        with patch.object(server, "ollama_client", client):
+            result = await server.chat_with_ollama("Hello", ctx=ctx)
+
+        assert result == "Partial answer"
+        client.generate.assert_not_called()
+        assert [call.kwargs["message"] for call in ctx.report_progress.call_args_list] == ["Partial", " answer"]
+        assert [call.args[0] for call in ctx.report_progress.call_args_list] == [7, 14]
+
+    @pytest.mark.parametrize(
+        "tool_name, arguments",
+        [
+            ("chat_with_ollama", {"prompt": "Hello"}),
+            ("chat_with_context", {"message": "Hello", "context": "Greeting"}),
+            ("analyze_data_with_llm", {"table_name": "users", "question": "Anything?"}),
+            ("analyze_database_with_llamaindex", {"question": "Anything?"}),
+        ],
+    )
+    async def test_llm_tools_via_call_tool_without_progress_token(
+        self, populated_db, mock_ollama_client, tool_name, arguments
+    ):
+        """Test that tools called outside a live request fall back to a plain generate()."""
+        content, _ = await server.mcp.call_tool(tool_name, arguments)
+
+        assert content[0].text == "Mock LLM response"
+        mock_ollama_client.generate.assert_awaited_once()
+
+    async def test_analyze_data_with_llm_table_name_ignores_case(self, populated_db, mock_ollama_client):
+        """Test that a differently cased table name is accepted, as SQLite itself would."""
+        result = await server.analyze_data_with_llm("Users", "Anything?")
+
+        assert result == "Mock LLM response"
+        _, prompt = mock_ollama_client.generate.call_args.args
+        assert "Test User 1" in prompt
+
+    async def test_analyze_data_with_llm_rejects_unknown_table(self, populated_db, mock_ollama_client):
+        """Test that table names outside the database are rejected before any SQL is built."""
+        result = await server.analyze_data_with_llm("users; DROP TABLE users", "Anything?")
+
+        assert "Unknown table" in result
+        mock_ollama_client.generate.assert_not_called()
+        assert len(await populated_db.execute_query("SELECT * FROM users")) == 2